@@ -0,0 +1,102 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from metrics import ALBUM_WAIT
+
+
+class AlbumAggregator:
+    """Сборщик медиагрупп с таймером тишины
+
+    Каждая часть альбома перезапускает таймер своей группы. Как только за
+    quiet секунд не пришло ни одной новой части, группа передаётся в
+    on_complete. Обработчики сообщений при этом не ждут и сразу возвращаются.
+
+    Память ограничена: группа закрывается досрочно, если набрала max_parts
+    частей или живёт дольше max_age секунд, а при переполнении max_groups
+    самая старая группа закрывается, чтобы освободить место.
+    """
+
+    def __init__(self, on_complete, quiet: float = 1.0, max_parts: int = 10,
+                 max_age: float = 30.0, max_groups: int = 100):
+        self.on_complete = on_complete
+        self.quiet = quiet
+        self.max_parts = max_parts
+        self.max_age = max_age
+        self.max_groups = max_groups
+        self._groups = {}  # media_group_id -> данные альбома (в порядке создания)
+        self._timers = {}  # media_group_id -> asyncio.TimerHandle
+        self._tasks = set()
+        # Группы, закрытые по лимиту частей: их опоздавшие части отбрасываем
+        self._overflowed = OrderedDict()
+
+    def __len__(self):
+        return len(self._groups)
+
+    def add(self, media_group_id, user_id: int, chat_id: int, media, caption: str = ""):
+        """Добавить часть альбома и перезапустить таймер группы"""
+        if media_group_id in self._overflowed:
+            logging.warning(f"Альбом {media_group_id} превысил {self.max_parts} медиа, часть отброшена")
+            return
+        group = self._groups.get(media_group_id)
+        if group is None:
+            if len(self._groups) >= self.max_groups:
+                oldest = next(iter(self._groups))
+                logging.warning(f"Слишком много незавершённых альбомов, закрываю {oldest}")
+                self._complete(oldest)
+            group = self._groups[media_group_id] = {
+                "media_group_id": media_group_id,
+                "media": [],
+                "caption": "",
+                "created_at": time.monotonic(),
+                "user_id": user_id,
+                "chat_id": chat_id,
+            }
+
+        group["media"].append(media)
+        # Подпись альбома Telegram присылает только в одной из частей
+        if caption and not group["caption"]:
+            group["caption"] = caption
+
+        timer = self._timers.pop(media_group_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        age = time.monotonic() - group["created_at"]
+        if len(group["media"]) >= self.max_parts:
+            # В Telegram в альбоме не больше 10 медиа, лишнее больше не примем
+            self._overflowed[media_group_id] = True
+            if len(self._overflowed) > self.max_groups:
+                self._overflowed.popitem(last=False)
+            self._complete(media_group_id)
+        elif age >= self.max_age:
+            self._complete(media_group_id)
+        else:
+            loop = asyncio.get_running_loop()
+            self._timers[media_group_id] = loop.call_later(self.quiet, self._complete, media_group_id)
+
+    def _complete(self, media_group_id):
+        timer = self._timers.pop(media_group_id, None)
+        if timer is not None:
+            timer.cancel()
+        group = self._groups.pop(media_group_id, None)
+        if group is None or not group["media"]:
+            return
+        ALBUM_WAIT.observe(time.monotonic() - group["created_at"])
+        task = asyncio.ensure_future(self._run_callback(group))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_callback(self, group):
+        try:
+            await self.on_complete(group)
+        except Exception as e:
+            logging.error(f"Ошибка сохранения альбома: {e}")
+
+    async def flush(self):
+        """Закрыть все незавершённые альбомы (при остановке бота)"""
+        for media_group_id in list(self._groups):
+            self._complete(media_group_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,72 @@
+"""Бенчмарк рассылки поста в несколько каналов
+
+Имитирует отправку в N каналов с заданной задержкой API и сравнивает
+последовательную отправку с параллельной при разных лимитах. Отдельно
+проверяется, что один медленный и один падающий канал не задерживают
+остальные.
+
+Запуск: python benchmarks/bench_fanout.py [--channels 50] [--latency 0.2]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from publisher import fan_out
+
+POST = {"type": "text", "text": "Тестовый пост"}
+
+
+def make_send(latency: float, slow=None, broken=None, finished=None):
+    async def send(channel, post):
+        delay = latency * random.uniform(0.8, 1.2)
+        if channel == slow:
+            delay *= 10
+        await asyncio.sleep(delay)
+        if channel == broken:
+            raise RuntimeError("Bad Request: chat not found")
+        if finished is not None:
+            finished[channel] = time.perf_counter()
+    return send
+
+
+async def run(channels, latency, concurrency, **kwargs):
+    start = time.perf_counter()
+    finished = {}
+    results = await fan_out(make_send(latency, finished=finished, **kwargs), POST, channels, concurrency)
+    wall = time.perf_counter() - start
+    return wall, results, {c: t - start for c, t in finished.items()}
+
+
+async def main_async(args):
+    channels = [f"@channel_{i}" for i in range(args.channels)]
+    print(f"{args.channels} каналов, задержка API ~{args.latency * 1000:.0f} мс")
+    print(f"{'лимит':>8} {'время, с':>10}")
+    for concurrency in (1, 5, 10, 25, args.channels):
+        wall, _, _ = await run(channels, args.latency, concurrency)
+        print(f"{concurrency:>8} {wall:>10.2f}")
+
+    wall, results, finished = await run(
+        channels, args.latency, args.channels, slow=channels[0], broken=channels[1]
+    )
+    others = [t for c, t in finished.items() if c != channels[0]]
+    errors = sum(1 for e in results.values() if e is not None)
+    print(
+        f"\nМедленный + падающий канал: общее время {wall:.2f} с, "
+        f"остальные каналы готовы за {max(others):.2f} с, ошибок: {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка одного запроса, с")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
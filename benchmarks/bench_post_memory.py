@@ -0,0 +1,83 @@
+"""Память очереди постов: словари старого формата против posts.Post
+
+Генерирует одну и ту же очередь в двух видах: список словарей со строковым
+временем (так posts.json читался раньше) и компактные записи, из которых
+JsonPostStore собирает неизменяемые Post. Для каждого вида печатается,
+сколько памяти удерживает загруженная очередь (по tracemalloc), сколько это
+на один пост, размер файла и время загрузки.
+
+Запуск: python benchmarks/bench_post_memory.py [--sizes 1000,100000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from posts import encode, decode, format_time
+from suite import make_posts
+
+
+def legacy_dict(post):
+    """Пост в том виде, в каком его хранили обработчики до перехода на Post"""
+    data = {"id": post.id, "time": format_time(post.ts), "type": post.type}
+    if post.media:
+        data["media"] = [{"kind": m.kind.value, "file_id": m.file_id} for m in post.media]
+        data["caption"] = post.text
+    else:
+        data["text"] = post.text
+    return data
+
+
+def retained(load) -> int:
+    """Сколько байт удерживает результат load()"""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        result = load()
+        size = tracemalloc.get_traced_memory()[0] - base
+        # Результат живёт до замера: иначе память освободится раньше, чем её посчитают
+        del result
+        return size
+    finally:
+        tracemalloc.stop()
+
+
+def load_time(load) -> float:
+    # Отдельно от tracemalloc, который сильно замедляет создание объектов
+    start = time.perf_counter()
+    load()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000")
+    args = parser.parse_args()
+
+    print(f"{'постов':>8} {'формат':<8} {'память, МиБ':>12} {'байт/пост':>10} {'файл, МиБ':>10} {'загрузка, мс':>13}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        posts = make_posts(size)
+        files = {
+            "dict": json.dumps([legacy_dict(post) for post in posts], ensure_ascii=False, indent=2),
+            "Post": json.dumps({"version": 2, "posts": [encode(post) for post in posts]},
+                               ensure_ascii=False, separators=(",", ":")),
+        }
+        loaders = {
+            "dict": lambda: json.loads(files["dict"]),
+            "Post": lambda: [decode(record) for record in json.loads(files["Post"])["posts"]],
+        }
+        del posts
+        for name, load in loaders.items():
+            memory, elapsed = retained(load), load_time(load)
+            file_size = len(files[name].encode("utf-8"))
+            print(f"{size:>8} {name:<8} {memory / 2 ** 20:>12.1f} {memory / size:>10.0f} "
+                  f"{file_size / 2 ** 20:>10.1f} {elapsed * 1e3:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Бенчмарк поиска свободного слота
+
+Сравнивает прежнюю get_next_publish_time (разбор каждого поста и сканирование
+8 дней вперёд) с SlotIndex. Для каждого размера очереди печатается время
+одного запроса и то, выдала ли старая функция уже занятый слот.
+
+Запуск: python benchmarks/bench_slots.py [--sizes 100,1000,10000,100000]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slots import SlotIndex
+
+TIMES = ["09:00", "13:00", "17:00", "21:00"]
+
+
+def legacy_next_publish_time(times, existing_posts):
+    """Прежняя реализация get_next_publish_time без изменений"""
+    now = datetime.now()
+    times = sorted([datetime.strptime(t, "%H:%M").time() for t in times])
+
+    busy_times = set()
+    for post in existing_posts:
+        try:
+            post_time = datetime.strptime(post["time"], "%H:%M %d.%m.%Y")
+            busy_times.add(post_time.strftime("%H:%M %d.%m.%Y"))
+        except:
+            continue
+
+    for day in range(8):
+        current_date = now.date() + timedelta(days=day)
+        for t in times:
+            publish_time = datetime.combine(current_date, t)
+            if day == 0 and publish_time < now:
+                continue
+            time_str = publish_time.strftime("%H:%M %d.%m.%Y")
+            if time_str not in busy_times:
+                return time_str
+
+    next_week = now.date() + timedelta(days=7)
+    return datetime.combine(next_week, times[0]).strftime("%H:%M %d.%m.%Y")
+
+
+def make_queue(size: int):
+    """Очередь, плотно занявшая ближайшие слоты подряд"""
+    index = SlotIndex(TIMES)
+    slots = index.next_free_many(size)
+    return [{"time": dt.strftime("%H:%M %d.%m.%Y")} for dt in slots], slots
+
+
+def timeit(fn, min_time=0.2):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    args = parser.parse_args()
+
+    print(f"{'очередь':>10} {'legacy, мкс':>14} {'SlotIndex, мкс':>16} {'next 100, мкс':>15} {'legacy занят?':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        posts, slots = make_queue(size)
+        index = SlotIndex(TIMES)
+        for dt in slots:
+            index.add(dt.timestamp())
+
+        legacy = timeit(lambda: legacy_next_publish_time(TIMES, posts))
+        indexed = timeit(index.next_free)
+        batch = timeit(lambda: index.next_free_many(100))
+
+        busy = {p["time"] for p in posts}
+        double_booked = legacy_next_publish_time(TIMES, posts) in busy
+        assert index.next_free().strftime("%H:%M %d.%m.%Y") not in busy
+
+        print(
+            f"{size:>10} {legacy * 1e6:>14.1f} {indexed * 1e6:>16.2f} "
+            f"{batch * 1e6:>15.1f} {'да' if double_booked else 'нет':>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
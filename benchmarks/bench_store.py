@@ -0,0 +1,93 @@
+"""Бенчмарк постановки поста в очередь
+
+Сравнивает старую схему (прочитать posts.json, дописать пост, перезаписать
+файл) с JsonPostStore, где добавление идёт в память, а запись на диск
+объединяется в пакеты. Для каждого размера очереди печатается средняя
+стоимость одного добавления и время записи одного пакетного снимка.
+
+Запуск: python benchmarks/bench_store.py [--sizes 100,1000,10000,100000]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from posts import from_legacy
+from storage import JsonPostStore
+
+# Старый способ дальше этого размера становится слишком медленным для замера
+LEGACY_LIMIT = 10000
+
+
+def make_post(i: int):
+    t = datetime(2030, 1, 1, 9, 0) + timedelta(hours=i)
+    return {
+        "time": t.strftime("%H:%M %d.%m.%Y"),
+        "type": "single",
+        "media": [{"kind": "photo", "file_id": f"AgACAgIAAxkBAAI{i:012d}"}],
+        "caption": f"Пост №{i}\n\n<b>Стандартный</b> текст",
+    }
+
+
+def fill_file(path: str, size: int):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([make_post(i) for i in range(size)], f, ensure_ascii=False, indent=2)
+
+
+def bench_legacy(path: str, size: int, ops: int) -> float:
+    fill_file(path, size)
+    start = time.perf_counter()
+    for i in range(ops):
+        with open(path, "r", encoding="utf-8") as f:
+            posts = json.load(f)
+        posts.append(make_post(size + i))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(posts, f, ensure_ascii=False, indent=2)
+    return (time.perf_counter() - start) / ops
+
+
+async def bench_store(path: str, size: int, ops: int):
+    """Вернуть (стоимость одного add, время одного пакетного сохранения)"""
+    fill_file(path, size)
+    store = JsonPostStore(path)
+    store.load()
+    # Файл в старом формате: перевод в компактный не должен попасть в замер
+    await store.flush()
+    start = time.perf_counter()
+    for i in range(ops):
+        store.add(from_legacy(make_post(size + i)))
+        # Имитируем то, что между сообщениями админа отрабатывает event loop
+        await asyncio.sleep(0)
+    add_cost = (time.perf_counter() - start) / ops
+
+    # Весь пакет ложится на диск одной атомарной записью вне event loop
+    start = time.perf_counter()
+    await store.close()
+    return add_cost, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    parser.add_argument("--ops", type=int, default=50, help="добавлений на каждый размер")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    print(f"{'очередь':>10} {'legacy, мкс/пост':>18} {'JsonPostStore, мкс/пост':>24} {'снимок, мс':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "posts.json")
+        for size in sizes:
+            legacy = bench_legacy(path, size, args.ops) if size <= LEGACY_LIMIT else None
+            add_cost, flush_time = asyncio.run(bench_store(path, size, args.ops))
+            legacy_str = f"{legacy * 1e6:.1f}" if legacy is not None else "—"
+            print(f"{size:>10} {legacy_str:>18} {add_cost * 1e6:>24.1f} {flush_time * 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Локальная замена Telegram Bot API для нагрузочных тестов
+
+Отвечает на sendPhoto, sendVideo, sendMediaGroup, sendMessage и прочие
+методы, которые вызывает бот, с настраиваемой задержкой, долей ошибок 5xx
+и ответов 429 (Too Many Requests). Каждая принятая отправка записывается,
+чтобы потом сверить её с расписанием.
+
+Подключение к боту:
+    bot.session.api = TelegramAPIServer.from_base("http://127.0.0.1:8081")
+
+Отдельный запуск: python benchmarks/fake_api.py [--port 8081] [--latency 0.05]
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+from aiohttp import web
+
+SEND_METHODS = {"sendphoto", "sendvideo", "sendmediagroup", "sendmessage"}
+
+
+class FakeBotAPI:
+    """HTTP-сервер с поведением Bot API: /bot<token>/<method>"""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.5, error_rate: float = 0.0,
+                 flood_rate: float = 0.0, retry_after: int = 1, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.sent = []  # (время приёма, метод, chat_id, текст или подпись)
+        self.requests = Counter()
+        self.errors = Counter()
+        self._message_id = 0
+        self._runner = None
+
+    # --------------------------------------------------------------------
+    # Обработка запросов
+    # --------------------------------------------------------------------
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.requests[method] += 1
+        delay = self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+        await asyncio.sleep(max(0.0, delay))
+
+        roll = self.random.random()
+        if roll < self.flood_rate:
+            self.errors["429"] += 1
+            return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                               parameters={"retry_after": self.retry_after})
+        if roll < self.flood_rate + self.error_rate:
+            self.errors["500"] += 1
+            return self._error(500, "Internal Server Error")
+
+        name = method.lower()
+        if name in SEND_METHODS:
+            self.sent.append((time.time(), method, params.get("chat_id"), self._text(name, params)))
+        if name == "sendmediagroup":
+            media = json.loads(params.get("media") or "[]")
+            return self._ok([self._message(params) for _ in media])
+        if name.startswith(("send", "edit")):
+            return self._ok(self._message(params))
+        return self._ok(True)
+
+    @staticmethod
+    def _text(name: str, params) -> str:
+        if name == "sendmediagroup":
+            media = json.loads(params.get("media") or "[]")
+            return (media[0].get("caption") or "") if media else ""
+        return params.get("text") or params.get("caption") or ""
+
+    def _message(self, params):
+        self._message_id += 1
+        chat_id = params.get("chat_id", "0")
+        try:
+            chat_id = int(chat_id)
+        except ValueError:
+            # @username канала: Bot API вернул бы числовой id
+            chat_id = -1000000000000 - abs(hash(chat_id)) % 10 ** 9
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "channel"},
+            "text": params.get("text") or "",
+        }
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(code: int, description: str, **extra) -> web.Response:
+        return web.json_response({"ok": False, "error_code": code, "description": description, **extra},
+                                 status=code)
+
+    # --------------------------------------------------------------------
+    # Запуск
+    # --------------------------------------------------------------------
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        """Запустить сервер, вернуть базовый адрес для TelegramAPIServer.from_base"""
+        app = web.Application(client_max_size=50 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def markers(self, prefix: str, chats=None):
+        """Время первой доставки каждого поста с меткой prefix-<n> в тексте: {(n, chat_id): время}"""
+        pattern = re.compile(re.escape(prefix) + r"-(\d+)")
+        found = {}
+        for received, _, chat_id, text in self.sent:
+            if chats is not None and chat_id not in chats:
+                continue
+            match = pattern.search(text)
+            if match:
+                found.setdefault((int(match.group(1)), chat_id), received)
+        return found
+
+
+async def serve(args):
+    api = FakeBotAPI(args.latency, error_rate=args.error_rate, flood_rate=args.flood_rate)
+    print(f"Фейковый Bot API: {await api.start(args.host, args.port)}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="средняя задержка ответа, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""Сквозной нагрузочный тест бота на локальном фейковом Bot API
+
+Поднимает FakeBotAPI, направляет в него сессию бота и с заданной частотой
+подаёт через dp.feed_update синтетические апдейты нескольких админов:
+одиночные фото, альбомы, текст и листание очереди. Параллельно в очередь
+ставятся посты с точным временем на ближайшие минуты, чтобы проверить,
+насколько вовремя планировщик публикует их под нагрузкой.
+
+Отчёт: пропускная способность хендлеров и их задержки, задержка от апдейта
+до постановки поста в очередь, точность публикации относительно расписания
+и статистика фейкового API.
+
+Запуск: python benchmarks/load_sim.py [--rate 20] [--duration 70] [--latency 0.05]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import itertools
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_api import FakeBotAPI
+
+CHANNEL = "-1001000000001"
+VIEWER_ID = 999
+
+
+def percentiles(values):
+    """p50 / p95 / p99 / максимум, в миллисекундах"""
+    if not values:
+        return "нет данных"
+    values = sorted(values)
+
+    def pick(q):
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return f"p50 {pick(0.5):.0f} мс, p95 {pick(0.95):.0f} мс, p99 {pick(0.99):.0f} мс, макс {values[-1] * 1000:.0f} мс"
+
+
+class Driver:
+    """Генератор апдейтов от имени админов"""
+
+    def __init__(self, app, admins, seed: int = 1):
+        self.app = app
+        self.admins = admins
+        self.random = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.post_ids = itertools.count(1)
+        self.sent_at = {}  # номер поста -> когда ушёл первый апдейт
+        self.enqueued_at = {}  # номер поста -> когда пост встал в очередь
+        self.handler_times = []
+        self.failures = 0
+        self.viewer_opened = False
+
+    # --------------------------------------------------------------------
+    # Апдейты
+    # --------------------------------------------------------------------
+    def _message(self, user_id: int, **fields):
+        from aiogram.types import Update
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+            **fields,
+        }
+        return Update.model_validate({"update_id": next(self.update_ids), "message": message})
+
+    @staticmethod
+    def _photo(n: int):
+        return [{"file_id": f"sim-photo-{n}", "file_unique_id": f"u{n}", "width": 1280, "height": 720}]
+
+    def _callback(self, data: str):
+        from aiogram.types import Update
+        user = {"id": VIEWER_ID, "is_bot": False, "first_name": "Viewer"}
+        message = {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": VIEWER_ID, "type": "private"},
+            "text": "…",
+        }
+        return Update.model_validate({
+            "update_id": next(self.update_ids),
+            "callback_query": {"id": str(next(self.update_ids)), "from": user, "chat_instance": "sim",
+                               "message": message, "data": data},
+        })
+
+    def next_batch(self):
+        """Следующее действие админа: список апдейтов, которые уходят подряд"""
+        from browser import PostsCallback
+        admin = self.random.choice(self.admins)
+        roll = self.random.random()
+        if roll < 0.1:
+            if self.random.random() < 0.3 or not self.viewer_opened:
+                self.viewer_opened = True
+                return [self._message(VIEWER_ID, text="Запланированные публикации 📝")]
+            page = self.random.randint(0, 20)
+            return [self._callback(PostsCallback(action="page", page=page).pack())]
+
+        n = next(self.post_ids)
+        self.sent_at[n] = time.perf_counter()
+        if roll < 0.5:
+            return [self._message(admin, photo=self._photo(n), caption=f"sim-{n} фото")]
+        if roll < 0.7:
+            group = f"album-{n}"
+            parts = self.random.randint(2, 10)
+            return [
+                self._message(admin, photo=self._photo(n * 100 + i), media_group_id=group,
+                              caption=f"sim-{n} альбом" if i == 0 else None)
+                for i in range(parts)
+            ]
+        return [self._message(admin, text=f"sim-{n} текст")]
+
+    async def feed(self, update):
+        start = time.perf_counter()
+        try:
+            await self.app.dp.feed_update(self.app.current_tenant().bot, update)
+        except Exception:
+            self.failures += 1
+        self.handler_times.append(time.perf_counter() - start)
+
+    def track_enqueue(self):
+        """Засекать момент, когда пост с меткой sim-<n> попадает в очередь"""
+        enqueue_post = self.app.enqueue_post
+
+        def tracked(post):
+            enqueue_post(post)
+            if post.text.startswith("sim-"):
+                n = int(post.text[4:].split()[0])
+                self.enqueued_at.setdefault(n, time.perf_counter())
+        self.app.enqueue_post = tracked
+
+
+def schedule_exact_posts(app, minutes: int, per_minute: int):
+    """Посты на ближайшие минуты с точным временем: {номер: время по расписанию}"""
+    from posts import Post
+    first = (datetime.now() + timedelta(seconds=20)).replace(second=0, microsecond=0) + timedelta(minutes=1)
+    posts, expected = [], {}
+    for m in range(minutes):
+        at = first + timedelta(minutes=m)
+        for k in range(per_minute):
+            n = m * per_minute + k
+            posts.append(Post(ts=int(at.timestamp()), text=f"acc-{n}"))
+            expected[n] = at.timestamp()
+    app.enqueue_many(posts)
+    return expected, first
+
+
+async def run(args):
+    api = FakeBotAPI(args.latency, error_rate=args.error_rate, flood_rate=args.flood_rate, seed=1)
+    base = await api.start(port=args.port)
+
+    admins = list(range(1, args.admins + 1))
+    os.environ["BOT_TOKEN"] = "123456:sim"
+    os.environ["ADMIN_IDS"] = ",".join(map(str, admins + [VIEWER_ID]))
+    os.environ.pop("POSTS_STORAGE", None)
+    os.environ.pop("LEDGER_PATH", None)
+    os.environ.pop("TENANTS_FILE", None)
+    channels = [CHANNEL] + [f"-100100000{i:04d}" for i in range(2, args.channels + 1)]
+    with open("config.json", "w", encoding="utf-8") as f:
+        json.dump({"channel_id": channels[0], "channels": channels[1:],
+                   "publish_times": ["09:00", "13:00", "17:00", "21:00"], "standard_text": "Подпись канала"}, f)
+
+    import main as app
+    from aiogram.client.telegram import TelegramAPIServer
+    app.bot.session.api = TelegramAPIServer.from_base(base)
+    app.albums.quiet = args.album_quiet
+
+    # То же, что делает main() перед запуском поллинга
+    app.store.load()
+    app.ledger.open()
+    app.slot_index.set_schedule(app.load_config().slot_schedule)
+    app.config_store.subscribe(app.on_config_change)
+    scheduler_job = asyncio.create_task(app.scheduler_task())
+
+    driver = Driver(app, admins)
+    driver.track_enqueue()
+    expected, first_publish = schedule_exact_posts(app, args.publish_minutes, args.per_minute)
+    for admin in admins:
+        await driver.feed(driver._message(admin, text="Отложить посты в канал ⌛"))
+    driver.handler_times.clear()
+
+    print(f"Нагрузка: {args.rate} действий/с в течение {args.duration} с, {args.admins} админов, "
+          f"{len(channels)} каналов, задержка API ~{args.latency * 1000:.0f} мс")
+    print(f"Точные публикации: {len(expected)} постов, первая в {first_publish:%H:%M:%S}")
+
+    tasks = set()
+    start = time.perf_counter()
+    for i in range(int(args.rate * args.duration)):
+        # Открытая модель нагрузки: новые апдейты не ждут обработки старых
+        await asyncio.sleep(max(0.0, start + i / args.rate - time.perf_counter()))
+        for update in driver.next_batch():
+            task = asyncio.create_task(driver.feed(update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    await app.albums.flush()
+    handled_in = time.perf_counter() - start
+
+    # Ждём, пока планировщик разошлёт все точные публикации
+    deadline = max(expected.values()) + args.grace
+    while time.time() < deadline and len(api.markers("acc", channels)) < len(expected) * len(channels):
+        await asyncio.sleep(0.5)
+
+    scheduler_job.cancel()
+    await asyncio.gather(scheduler_job, return_exceptions=True)
+    await app.send_queue.close()
+    await app.store.close()
+    app.ledger.close()
+    await app.bot.session.close()
+    await api.stop()
+
+    # --------------------------------------------------------------------
+    # Отчёт
+    # --------------------------------------------------------------------
+    handled = len(driver.handler_times)
+    print(f"\nХендлеры: {handled} апдейтов за {handled_in:.1f} с — {handled / handled_in:.1f} апдейтов/с, "
+          f"ошибок {driver.failures}")
+    print(f"  время обработки: {percentiles(driver.handler_times)}")
+    latencies = [driver.enqueued_at[n] - driver.sent_at[n] for n in driver.enqueued_at if n in driver.sent_at]
+    print(f"Постановка в очередь: {len(latencies)}/{len(driver.sent_at)} постов, {percentiles(latencies)}")
+
+    delivered = api.markers("acc", channels)
+    late = [received - expected[n] for (n, _), received in delivered.items()]
+    missing = len(expected) * len(channels) - len(delivered)
+    print(f"Точность публикации: доставлено {len(delivered)}, не доставлено {missing}")
+    print(f"  опоздание относительно расписания: {percentiles(late)}")
+    requests = ", ".join(f"{method} {count}" for method, count in api.requests.most_common())
+    print(f"Фейковый API: {requests}; ответов 500: {api.errors['500']}, 429: {api.errors['429']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=20, help="действий админов в секунду")
+    parser.add_argument("--duration", type=float, default=70, help="длительность подачи апдейтов, с")
+    parser.add_argument("--admins", type=int, default=20)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="средняя задержка фейкового API, с")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="доля ответов 500")
+    parser.add_argument("--flood-rate", type=float, default=0.01, help="доля ответов 429")
+    parser.add_argument("--publish-minutes", type=int, default=2, help="минут с точными публикациями")
+    parser.add_argument("--per-minute", type=int, default=5, help="точных публикаций на минуту")
+    parser.add_argument("--album-quiet", type=float, default=1.0, help="таймер тишины сборщика альбомов, с")
+    parser.add_argument("--grace", type=float, default=60, help="сколько ждать опоздавшие публикации, с")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Набор микробенчмарков горячих путей планирования и хранения
+
+Генерирует синтетические posts.json заданных размеров и для каждого меряет:
+поиск следующего слота (get_next_publish_time), загрузку и сохранение очереди,
+одну итерацию планировщика с заглушкой вместо Bot API и сборку подписи и
+медиагруппы альбома. Для каждого замера печатаются операции в секунду и пик
+памяти по tracemalloc; результаты сохраняются в JSON, и два таких файла можно
+сравнить, чтобы увидеть регрессии между версиями.
+
+Запуск:
+    python benchmarks/suite.py [--sizes 100,1000,10000,100000] [--out results.json]
+    python benchmarks/suite.py --compare old.json new.json [--threshold 0.1]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from slots import SlotIndex
+from posts import Post, Media, MediaKind
+from storage import JsonPostStore, post_timestamp
+
+TIMES = ["09:00", "13:00", "17:00", "21:00"]
+STANDARD_TEXT = "<b>Стандартный</b> текст канала"
+CHANNEL = "@bench_channel"
+
+
+# ========================================================================
+# СИНТЕТИЧЕСКИЕ ДАННЫЕ
+# ========================================================================
+def make_posts(size: int, seed: int = 1):
+    """Очередь, плотно занявшая ближайшие слоты: одиночные медиа, альбомы и текст"""
+    rng = random.Random(seed)
+    posts = []
+    for i, slot in enumerate(SlotIndex(TIMES).next_free_many(size)):
+        kind = rng.random()
+        if kind < 0.6:
+            media = (Media(MediaKind.PHOTO, f"AgACAgIAAxkBAAI{i:012d}"),)
+        elif kind < 0.9:
+            media = tuple(Media(rng.choice(tuple(MediaKind)), f"BAACAgIAAxkBAAI{i:08d}{j:04d}")
+                          for j in range(rng.randint(2, 10)))
+        else:
+            media = ()
+        text = f"{'Текстовый пост' if not media else 'Пост'} №{i}\n\n{STANDARD_TEXT}"
+        posts.append(Post(ts=int(slot.timestamp()), text=text, media=media, id=f"{i:032x}"))
+    return posts
+
+
+def write_posts(path: str, posts):
+    store = JsonPostStore(path)
+    store.add_many(posts)
+    store.flush_sync()
+
+
+# ========================================================================
+# ИЗМЕРЕНИЕ
+# ========================================================================
+def measure(op, min_time: float, min_runs: int = 3):
+    """Операций в секунду: op выполняется, пока не наберётся min_time секунд"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        op()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time and runs >= min_runs:
+            return runs / elapsed
+
+
+async def measure_async(op, min_time: float, min_runs: int = 3):
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        await op()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time and runs >= min_runs:
+            return runs / elapsed
+
+
+def peak_memory(op) -> int:
+    """Пик выделенной памяти за одну операцию, байты"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        op()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+async def peak_memory_async(op) -> int:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        await op()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+# ========================================================================
+# БЕНЧМАРКИ
+# ========================================================================
+def import_bot(workdir: str):
+    """Импортировать main.py с заглушкой сессии вместо настоящего Bot API"""
+    os.environ.setdefault("BOT_TOKEN", "1:bench")
+    os.environ.setdefault("ADMIN_IDS", "1")
+    os.environ.pop("POSTS_STORAGE", None)
+    os.environ.pop("LEDGER_PATH", None)
+    os.environ.pop("TENANTS_FILE", None)
+    os.chdir(workdir)
+    with open("config.json", "w", encoding="utf-8") as f:
+        json.dump({"channel_id": CHANNEL, "publish_times": TIMES, "standard_text": STANDARD_TEXT}, f)
+
+    import main
+    from aiogram.types import Message
+    from aiogram.client.session.base import BaseSession
+
+    class StubSession(BaseSession):
+        """Отвечает на любой запрос сразу, без сети и без очереди отправки"""
+
+        async def make_request(self, bot, method, timeout=None):
+            return Message.model_validate({"message_id": 1, "date": 0, "chat": {"id": -1, "type": "channel"}})
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self):
+            pass
+
+    main.bot.session = StubSession()
+    main.ledger.open()
+    return main
+
+
+def bench_size(app, path: str, size: int, min_time: float):
+    posts = make_posts(size)
+    write_posts(path, posts)
+    results = {}
+
+    store = JsonPostStore(path)
+    results["load_posts"] = (measure(store.load, min_time), peak_memory(store.load))
+
+    def save():
+        store.replace(store.by_index(0))
+        store.flush_sync()
+    results["save_posts"] = (measure(save, min_time), peak_memory(save))
+
+    # Бот работает с этой же очередью
+    app.current_tenant().store = store
+    app.slot_index.set_times(TIMES)
+    app.slot_index.clear()
+    for post in store:
+        app.slot_index.add(post_timestamp(post))
+    results["get_next_publish_time"] = (
+        measure(app.get_next_publish_time, min_time), peak_memory(app.get_next_publish_time)
+    )
+
+    async def scheduler_iteration():
+        # Пост на текущую минуту: итерация снимает его с кучи, публикует и убирает из очереди
+        app.enqueue_post(Post(ts=int(datetime.now().replace(second=0).timestamp()), text="Тик"))
+        for due, overdue in app.scheduler._pop_due(time.time()).values():
+            await app.scheduler._publish_due(due)
+
+    async def run_scheduler():
+        app.scheduler._rebuild()
+        return await measure_async(scheduler_iteration, min_time), await peak_memory_async(scheduler_iteration)
+    results["scheduler_iteration"] = asyncio.run(run_scheduler())
+    return results
+
+
+def bench_album(app, min_time: float):
+    media = [Media(MediaKind.PHOTO if i % 2 else MediaKind.VIDEO, f"AgACAgIAAxkBAAI{i:012d}") for i in range(10)]
+    album = {"media": media, "caption": "Подпись альбома " * 20}
+
+    def build():
+        # То же, что делают commit_album и send_post для альбома из 10 медиа
+        post = Post(text=(album["caption"] or "") + "\n\n" + STANDARD_TEXT, media=tuple(album["media"]))
+        return app.build_media_group(post)
+    return measure(build, min_time), peak_memory(build)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_suite(sizes, min_time: float):
+    records = []
+
+    def report(name, size, ops, peak):
+        records.append({"bench": name, "size": size, "ops_per_sec": ops, "peak_bytes": peak})
+        print(f"{name:<24} {size:>8} {ops:>14.1f} {peak / 1024:>12.1f}")
+
+    print(f"{'бенчмарк':<24} {'постов':>8} {'оп/с':>14} {'пик, КиБ':>12}")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            bot_module = import_bot(tmp)
+            report("album_caption", 0, *bench_album(bot_module, min_time))
+            for size in sizes:
+                path = os.path.join(tmp, "posts.json")
+                for name, (ops, peak) in bench_size(bot_module, path, size, min_time).items():
+                    report(name, size, ops, peak)
+            bot_module.ledger.close()
+        finally:
+            os.chdir(cwd)
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": records,
+    }
+
+
+# ========================================================================
+# СРАВНЕНИЕ
+# ========================================================================
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Напечатать изменение оп/с между двумя прогонами, вернуть число регрессий"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    old_results = {(r["bench"], r["size"]): r for r in old["results"]}
+
+    print(f"{old['meta'].get('revision') or old_path} → {new['meta'].get('revision') or new_path}")
+    print(f"{'бенчмарк':<24} {'постов':>8} {'было оп/с':>12} {'стало оп/с':>12} {'изменение':>10} {'пик, КиБ':>18}")
+    regressions = 0
+    for record in new["results"]:
+        before = old_results.get((record["bench"], record["size"]))
+        if before is None:
+            continue
+        change = record["ops_per_sec"] / before["ops_per_sec"] - 1
+        mark = ""
+        if change < -threshold:
+            regressions += 1
+            mark = "  ⚠ регрессия"
+        peak = f"{before['peak_bytes'] / 1024:.0f} → {record['peak_bytes'] / 1024:.0f}"
+        print(
+            f"{record['bench']:<24} {record['size']:>8} {before['ops_per_sec']:>12.1f} "
+            f"{record['ops_per_sec']:>12.1f} {change:>+10.1%} {peak:>18}{mark}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    parser.add_argument("--min-time", type=float, default=0.5, help="минимальная длительность замера, с")
+    parser.add_argument("--out", help="куда сохранить результаты в JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="сравнить два файла результатов")
+    parser.add_argument("--threshold", type=float, default=0.1, help="замедление, которое считается регрессией")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    results = run_suite([int(s) for s in args.sizes.split(",")], args.min_time)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
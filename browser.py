@@ -0,0 +1,141 @@
+import html
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from posts import MediaKind, format_time
+
+PAGE_SIZE = 8
+SNIPPET_LENGTH = 40
+MAX_TEXT = 3500
+# Сколько строк плана переноса показывать в превью
+PLAN_PREVIEW = 15
+
+TYPE_ICONS = {"text": "📝", "single": "🖼", "album": "🗂"}
+KIND_ICONS = {MediaKind.PHOTO: "🖼", MediaKind.VIDEO: "🎬"}
+
+
+class PostsCallback(CallbackData, prefix="posts"):
+    """Кнопки просмотра очереди; пост адресуется постоянным id, а не номером"""
+
+    action: str  # page, open, preview, delete, confirm, date, close
+    page: int = 0
+    post_id: str = ""
+
+
+class ReslotCallback(CallbackData, prefix="reslot"):
+    """Кнопки превью переноса очереди"""
+
+    action: str  # apply, cancel
+    # Освободившееся время для сдвига после удаления; 0 — перенос на расписание
+    ts: int = 0
+
+
+def page_count(total: int) -> int:
+    return max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+
+
+def snippet(post) -> str:
+    """Начало подписи без стандартного текста, одной строкой"""
+    text = " ".join(post.text.split("\n\n")[0].split())
+    if len(text) > SNIPPET_LENGTH:
+        text = text[:SNIPPET_LENGTH - 1] + "…"
+    return text
+
+
+def post_summary(post, tz=None) -> str:
+    """Строка списка: время, тип, число медиа, начало подписи"""
+    if post.type == "album":
+        kind = f"{TYPE_ICONS['album']}×{len(post.media)}"
+    elif post.media:
+        kind = KIND_ICONS.get(post.media[0].kind, TYPE_ICONS["single"])
+    else:
+        kind = TYPE_ICONS["text"]
+    return f"{format_time(post.ts, tz=tz)} {kind} {snippet(post)}".rstrip()
+
+
+def render_page(posts, page: int, total: int, tz=None):
+    """Текст и клавиатура страницы списка; время показывается в поясе tz"""
+    pages = page_count(total)
+    offset = page * PAGE_SIZE
+    lines = [f"<b>Запланировано постов: {total}</b> (стр. {page + 1}/{pages})", ""]
+    buttons = []
+    for number, post in enumerate(posts, offset + 1):
+        lines.append(f"{number}. {html.escape(post_summary(post, tz))}")
+        buttons.append([InlineKeyboardButton(
+            text=f"{number}. {format_time(post.ts, tz=tz)}",
+            callback_data=PostsCallback(action="open", page=page, post_id=post.id).pack(),
+        )])
+    if not posts:
+        lines.append("Очередь пуста.")
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(
+            text="◀️", callback_data=PostsCallback(action="page", page=page - 1).pack()))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton(
+            text="▶️", callback_data=PostsCallback(action="page", page=page + 1).pack()))
+    if nav:
+        buttons.append(nav)
+    buttons.append([
+        InlineKeyboardButton(text="📅 К дате", callback_data=PostsCallback(action="date", page=page).pack()),
+        InlineKeyboardButton(text="Готово ✅", callback_data=PostsCallback(action="close").pack()),
+    ])
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def render_post(post, position: int, total: int, page: int, confirm_delete: bool = False, tz=None):
+    """Текст и клавиатура карточки одного поста"""
+    lines = [
+        f"<b>Пост {position + 1}/{total}</b>",
+        f"Время: {format_time(post.ts, tz=tz)}",
+        f"Медиа: {', '.join(KIND_ICONS.get(m.kind, '?') for m in post.media) or 'нет'}",
+    ]
+    if post.channels:
+        lines.append(f"Каналы: {html.escape(', '.join(map(str, post.channels)))}")
+    if post.repeat:
+        lines.append(f"Повтор: <code>{html.escape(post.repeat)}</code>")
+    # Текстовый пост может занять все 4096 символов сообщения, оставляем место под шапку
+    text = post.text
+    if len(text) > MAX_TEXT:
+        text = text[:MAX_TEXT - 1] + "…"
+    lines += ["", html.escape(text)]
+
+    post_id = post.id
+    if confirm_delete:
+        actions = [
+            InlineKeyboardButton(
+                text="Да, удалить 🗑",
+                callback_data=PostsCallback(action="confirm", page=page, post_id=post_id).pack()),
+            InlineKeyboardButton(
+                text="Нет", callback_data=PostsCallback(action="open", page=page, post_id=post_id).pack()),
+        ]
+    else:
+        actions = [
+            InlineKeyboardButton(
+                text="👁 Превью", callback_data=PostsCallback(action="preview", page=page, post_id=post_id).pack()),
+            InlineKeyboardButton(
+                text="Удалить ❌", callback_data=PostsCallback(action="delete", page=page, post_id=post_id).pack()),
+        ]
+    back = [InlineKeyboardButton(text="⬅️ К списку", callback_data=PostsCallback(action="page", page=page).pack())]
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=[actions, back])
+
+
+def render_plan(plan, freed_ts: int = 0, tz=None):
+    """Превью переноса: старое и новое время постов плана и кнопки применения"""
+    if freed_ts:
+        title = f"🧲 Сдвинуть посты на освободившееся место ({format_time(freed_ts, tz=tz)})?"
+    else:
+        title = "🔁 Перенести очередь на слоты текущего расписания?"
+    lines = [f"<b>{title}</b>", f"Постов сменят время: {len(plan)}", ""]
+    for post, ts in plan[:PLAN_PREVIEW]:
+        moved = f"{format_time(post.ts, tz=tz)} → {format_time(ts, tz=tz)}"
+        lines.append(html.escape(f"{moved} {TYPE_ICONS[post.type]} {snippet(post)}".rstrip()))
+    if len(plan) > PLAN_PREVIEW:
+        lines.append(f"… и ещё {len(plan) - PLAN_PREVIEW}")
+    buttons = [[
+        InlineKeyboardButton(text="Применить ✅", callback_data=ReslotCallback(action="apply", ts=freed_ts).pack()),
+        InlineKeyboardButton(text="Оставить как есть", callback_data=ReslotCallback(action="cancel").pack()),
+    ]]
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+QUEUED = "queued"
+PUBLISHED = "published"
+
+
+@dataclass(frozen=True, slots=True)
+class Duplicate:
+    """Совпадение медиа с постом в очереди или с недавней публикацией"""
+
+    unique_id: str
+    where: str  # QUEUED или PUBLISHED
+    post_id: str
+    published_at: float = None  # только для PUBLISHED
+
+
+class DuplicateIndex:
+    """Индекс медиа по file_unique_id: очередь и недавние публикации
+
+    file_id у одного и того же файла меняется от пересылки к пересылке,
+    а file_unique_id — нет, поэтому повтор ищется по нему. Проверка одного
+    медиа — пара поисков в словарях, без прохода по очереди. История
+    публикаций ограничена history последними медиа.
+    """
+
+    def __init__(self, history: int = 1000):
+        self.history = history
+        self._queued = {}  # file_unique_id -> {id поста: None}
+        self._published = OrderedDict()  # file_unique_id -> (id поста, время публикации)
+
+    def add(self, post):
+        for m in post.media:
+            if m.unique_id:
+                self._queued.setdefault(m.unique_id, {})[post.id] = None
+
+    def remove(self, post):
+        for m in post.media:
+            posts = self._queued.get(m.unique_id)
+            if posts is not None:
+                posts.pop(post.id, None)
+                if not posts:
+                    del self._queued[m.unique_id]
+
+    def clear(self):
+        """Забыть очередь (история публикаций остаётся)"""
+        self._queued.clear()
+
+    def published(self, post, at: float = None):
+        """Запомнить медиа опубликованного поста"""
+        at = time.time() if at is None else at
+        for m in post.media:
+            if m.unique_id:
+                self._remember(m.unique_id, post.id, at)
+
+    def load_history(self, records):
+        """Восстановить историю из записей (file_unique_id, id поста, время), старые первыми"""
+        for unique_id, post_id, at in records:
+            self._remember(unique_id, post_id, at)
+
+    def _remember(self, unique_id: str, post_id: str, at: float):
+        self._published.pop(unique_id, None)
+        self._published[unique_id] = (post_id, at)
+        while len(self._published) > self.history:
+            self._published.popitem(last=False)
+
+    def find(self, unique_id: str, exclude: str = None):
+        """Первое совпадение для одного медиа или None; exclude — id самого проверяемого поста"""
+        for post_id in self._queued.get(unique_id, ()):
+            if post_id != exclude:
+                return Duplicate(unique_id, QUEUED, post_id)
+        record = self._published.get(unique_id)
+        if record is not None:
+            return Duplicate(unique_id, PUBLISHED, *record)
+        return None
+
+    def check(self, media, exclude: str = None):
+        """Совпадения для списка медиа, по одному на каждое повторное медиа"""
+        found = (self.find(m.unique_id, exclude) for m in media if m.unique_id)
+        return [duplicate for duplicate in found if duplicate is not None]
@@ -0,0 +1,158 @@
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+
+class SqliteFSMStorage(BaseStorage):
+    """Хранилище состояний FSM: чтение из памяти, запись в SQLite пачками
+
+    Все состояния читаются в память при load(), поэтому get_state/get_data
+    работают так же быстро, как MemoryStorage. Изменённые ключи копятся и
+    раз в flush_delay секунд записываются одной транзакцией вне event loop.
+    Сессии, которые не менялись дольше ttl секунд, удаляются.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fsm (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS fsm_updated ON fsm (updated);
+    """
+
+    # Как часто чистить просроченные сессии
+    GC_INTERVAL = 3600
+
+    def __init__(self, path: str, flush_delay: float = 0.5, ttl: float = 7 * 86400):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.ttl = ttl
+        self._records = {}  # ключ -> [состояние, данные, время изменения]
+        self._dirty = set()
+        self._db = None
+        self._flush_handle = None
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+        self._next_gc = 0.0
+
+    @staticmethod
+    def _key(key) -> str:
+        return ":".join(str(part) if part is not None else "" for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny,
+        ))
+
+    # --------------------------------------------------------------------
+    # Загрузка и сохранение
+    # --------------------------------------------------------------------
+    def load(self):
+        """Прочитать все живые сессии в память (один раз при старте)"""
+        self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._gc(time.time())
+        for key, state, data, updated in self._db.execute("SELECT key, state, data, updated FROM fsm"):
+            try:
+                self._records[key] = [state, json.loads(data), updated]
+            except ValueError as e:
+                logging.error(f"Повреждённая сессия FSM {key}: {e}")
+        logging.info(f"Восстановлено сессий FSM: {len(self._records)}")
+
+    def _gc(self, now: float):
+        self._next_gc = now + self.GC_INTERVAL
+        expired = now - self.ttl
+        self._db.execute("DELETE FROM fsm WHERE updated < ?", (expired,))
+        for key in [key for key, record in self._records.items() if record[2] < expired]:
+            del self._records[key]
+
+    def _touch(self, key: str):
+        self._dirty.add(key)
+        if self._flush_handle is None and self._db is not None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Записать изменённые сессии одной транзакцией"""
+        async with self._lock:
+            if not self._dirty:
+                return
+            keys, self._dirty = self._dirty, set()
+            rows, removed = [], []
+            for key in keys:
+                record = self._records.get(key)
+                if record is None or (record[0] is None and not record[1]):
+                    # Пустая сессия ничего не хранит — удаляем строку
+                    self._records.pop(key, None)
+                    removed.append((key,))
+                    continue
+                try:
+                    rows.append((key, record[0], json.dumps(record[1], ensure_ascii=False), record[2]))
+                except TypeError as e:
+                    # Такая сессия живёт только в памяти, повторять запись бесполезно
+                    logging.error(f"Сессию FSM {key} нельзя сохранить: {e}")
+            try:
+                await asyncio.to_thread(self._write, rows, removed)
+            except Exception as e:
+                logging.error(f"Ошибка сохранения сессий FSM: {e}")
+                self._dirty |= keys
+            if time.time() >= self._next_gc:
+                self._gc(time.time())
+
+    def _write(self, rows, removed):
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO fsm (key, state, data, updated) VALUES (?, ?, ?, ?)", rows)
+            self._db.executemany("DELETE FROM fsm WHERE key = ?", removed)
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+        if self._db is not None:
+            await self.flush()
+            self._db.close()
+            self._db = None
+
+    # --------------------------------------------------------------------
+    # Интерфейс BaseStorage
+    # --------------------------------------------------------------------
+    def _record(self, key: str):
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = [None, {}, time.time()]
+        return record
+
+    async def set_state(self, key, state=None):
+        key = self._key(key)
+        record = self._record(key)
+        record[0] = state.state if isinstance(state, State) else state
+        record[2] = time.time()
+        self._touch(key)
+
+    async def get_state(self, key):
+        record = self._records.get(self._key(key))
+        return record[0] if record is not None else None
+
+    async def set_data(self, key, data):
+        key = self._key(key)
+        record = self._record(key)
+        record[1] = dict(data)
+        record[2] = time.time()
+        self._touch(key)
+
+    async def get_data(self, key):
+        record = self._records.get(self._key(key))
+        return dict(record[1]) if record is not None else {}
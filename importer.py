@@ -0,0 +1,255 @@
+import os
+import csv
+import time
+import json
+
+from posts import Post, Media, MediaKind, parse_time
+from schedule import compile_rule
+
+MEDIA_KINDS = tuple(kind.value for kind in MediaKind)
+MAX_ALBUM_SIZE = 10
+# Файлы, которые берутся при регистрации каталога с медиа
+MEDIA_EXTENSIONS = {
+    ".jpg": MediaKind.PHOTO, ".jpeg": MediaKind.PHOTO, ".png": MediaKind.PHOTO, ".webp": MediaKind.PHOTO,
+    ".mp4": MediaKind.VIDEO, ".mov": MediaKind.VIDEO, ".m4v": MediaKind.VIDEO, ".webm": MediaKind.VIDEO,
+}
+
+
+def manifest_format(filename: str):
+    """Формат манифеста по имени файла: "jsonl", "csv" или None"""
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    return None
+
+
+def confined_path(root: str, path: str):
+    """Полный путь path внутри каталога root или None, если path ведёт за его пределы
+
+    Относительный path считается от root; абсолютные пути, ".." и символические
+    ссылки наружу не проходят.
+    """
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    return resolved if os.path.commonpath([root, resolved]) == root else None
+
+
+def _text_field(record, key: str, line_no: int) -> str:
+    """Строковое поле записи; пустая строка, если поля нет"""
+    value = record.get(key)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"строка {line_no}: поле {key} должно быть строкой, а не {type(value).__name__}")
+    return value
+
+
+def _media_item(record, line_no: int, media_dir: str):
+    if not isinstance(record, dict):
+        raise ValueError(f"строка {line_no}: элемент media должен быть объектом")
+    kind = _text_field(record, "kind", line_no).strip().lower()
+    if kind not in MEDIA_KINDS:
+        raise ValueError(f"строка {line_no}: неизвестный тип медиа {kind!r}")
+    file_id = _text_field(record, "file_id", line_no).strip()
+    path = _text_field(record, "path", line_no).strip()
+    if bool(file_id) == bool(path):
+        raise ValueError(f"строка {line_no}: нужен ровно один из file_id или path")
+    if path:
+        if not media_dir:
+            raise ValueError(f"строка {line_no}: path недоступен — каталог локальных медиа не настроен (MEDIA_DIR)")
+        resolved = confined_path(media_dir, path)
+        if resolved is None or not os.path.isfile(resolved):
+            raise ValueError(f"строка {line_no}: файл {path} не найден в MEDIA_DIR")
+        path = resolved
+    return Media(MediaKind(kind), file_id, path)
+
+
+def _check_time(value, line_no: int, tz=None):
+    """Время из манифеста (в поясе tz) в секундах epoch; None, если не указано"""
+    value = value.strip()
+    if not value:
+        return None
+    ts = parse_time(value, tz)
+    if ts is None:
+        raise ValueError(f"строка {line_no}: время {value!r} не в формате HH:MM ДД.ММ.ГГГГ")
+    # Иначе планировщик сочтёт пост просроченным сразу после импорта
+    if ts <= time.time():
+        raise ValueError(f"строка {line_no}: время {value} уже прошло")
+    return ts
+
+
+def _check_repeat(value, line_no: int) -> str:
+    """Правило повтора из манифеста; пустая строка, если пост разовый"""
+    value = " ".join(value.split())
+    if value:
+        try:
+            rule = compile_rule(value)
+        except ValueError as e:
+            raise ValueError(f"строка {line_no}: неверное правило повтора {value!r} ({e})")
+        if rule.next_after(time.time()) is None:
+            raise ValueError(f"строка {line_no}: правило повтора {value!r} никогда не срабатывает")
+    return value
+
+
+def _check_channels(value, line_no: int) -> tuple:
+    """Свои каналы поста из манифеста; пустой кортеж — каналы из настроек
+
+    Принимается список или строка через запятую/пробел; канал — @username
+    или числовой id чата.
+    """
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    elif value is None:
+        value = []
+    elif not isinstance(value, list):
+        raise ValueError(f"строка {line_no}: channels должен быть списком каналов")
+    channels = []
+    for channel in value:
+        if isinstance(channel, bool) or not isinstance(channel, (str, int)):
+            raise ValueError(f"строка {line_no}: неверный канал {channel!r}")
+        channel = str(channel).strip()
+        if not ((len(channel) > 1 and channel.startswith("@")) or channel.lstrip("-").isdigit()):
+            raise ValueError(f"строка {line_no}: неверный канал {channel!r}, нужен @username или id чата")
+        channels.append(channel)
+    return tuple(dict.fromkeys(channels))
+
+
+def build_post(media, caption: str, publish_ts, standard_text: str, repeat: str = "", channels: tuple = ()):
+    """Собрать пост в том же виде, что и обработчики сообщений"""
+    return Post(
+        ts=publish_ts, text=caption + "\n\n" + standard_text, media=tuple(media), channels=channels, repeat=repeat
+    )
+
+
+def _jsonl_records(stream, media_dir: str, tz=None):
+    """Записи JSONL: одна строка — один пост
+
+    {"kind": "photo", "file_id": "...", "caption": "...", "time": "09:00 01.02.2030"}
+    {"media": [{"kind": "photo", "path": "a.jpg"}, {"kind": "video", "file_id": "..."}], "caption": "..."}
+    {"text": "Просто текст", "repeat": "0 10 * * mon Europe/Moscow", "channels": ["@news", "-1001234567890"]}
+    """
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"строка {line_no}: неверный JSON ({e})"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, f"строка {line_no}: ожидается объект"
+            continue
+        try:
+            if "media" in record:
+                items = record["media"] or []
+                if not isinstance(items, list):
+                    raise ValueError(f"строка {line_no}: media должен быть списком")
+                if len(items) > MAX_ALBUM_SIZE:
+                    raise ValueError(f"строка {line_no}: в альбоме больше {MAX_ALBUM_SIZE} медиа")
+                media = [_media_item(item, line_no, media_dir) for item in items]
+            elif record.get("kind"):
+                media = [_media_item(record, line_no, media_dir)]
+            else:
+                media = []
+            caption = _text_field(record, "caption", line_no) or _text_field(record, "text", line_no)
+            if not media and not caption:
+                raise ValueError(f"строка {line_no}: пустой пост")
+            publish_time = _check_time(_text_field(record, "time", line_no), line_no, tz)
+            repeat = _check_repeat(_text_field(record, "repeat", line_no), line_no)
+            channels = _check_channels(record.get("channels"), line_no)
+            yield line_no, (media, caption, publish_time, repeat, channels), None
+        except ValueError as e:
+            yield line_no, None, str(e)
+
+
+def _csv_records(stream, media_dir: str, tz=None):
+    """Записи CSV с колонками kind, file_id, path, caption, time, repeat, channels, album
+
+    Идущие подряд строки с одинаковым непустым album склеиваются в один альбом;
+    подпись, время, повтор и каналы альбома берутся из первой строки группы.
+    """
+    reader = csv.DictReader(stream)
+    group_key, group = None, None
+
+    def finish():
+        line_no, media, caption, publish_time, repeat, channels = group
+        if len(media) > MAX_ALBUM_SIZE:
+            return line_no, None, f"строка {line_no}: в альбоме больше {MAX_ALBUM_SIZE} медиа"
+        return line_no, (media, caption, publish_time, repeat, channels), None
+
+    for record in reader:
+        line_no = reader.line_num
+        try:
+            album = _text_field(record, "album", line_no).strip()
+            media = [_media_item(record, line_no, media_dir)] if _text_field(record, "kind", line_no).strip() else []
+            caption = _text_field(record, "caption", line_no)
+            publish_time = _check_time(_text_field(record, "time", line_no), line_no, tz)
+            repeat = _check_repeat(_text_field(record, "repeat", line_no), line_no)
+            channels = _check_channels(record.get("channels"), line_no)
+        except ValueError as e:
+            yield line_no, None, str(e)
+            continue
+
+        if album and album == group_key:
+            group[1].extend(media)
+            continue
+        if group is not None:
+            yield finish()
+            group_key, group = None, None
+        if album:
+            group_key, group = album, (line_no, media, caption, publish_time, repeat, channels)
+        elif not media and not caption:
+            yield line_no, None, f"строка {line_no}: пустой пост"
+        else:
+            yield line_no, (media, caption, publish_time, repeat, channels), None
+
+    if group is not None:
+        yield finish()
+
+
+def parse_manifest(stream, fmt: str, standard_text: str, media_dir: str = "", tz=None):
+    """Потоково разобрать манифест, вернуть (посты, ошибки)
+
+    Посты без явного времени возвращаются с ts=None — слоты для них
+    назначаются потом одним проходом по индексу слотов (повторяющиеся
+    посты встают на первую сработку своего правила). Локальные файлы (path)
+    берутся только из каталога media_dir; без него path не принимается.
+    Явное время читается в поясе tz — том же, что у расписания слотов.
+    """
+    if fmt == "jsonl":
+        records = _jsonl_records(stream, media_dir, tz)
+    else:
+        records = _csv_records(stream, media_dir, tz)
+    posts, errors = [], []
+    for _, parsed, error in records:
+        if error:
+            errors.append(error)
+            continue
+        media, caption, publish_time, repeat, channels = parsed
+        posts.append(build_post(media, caption, publish_time, standard_text, repeat, channels))
+    return posts, errors
+
+
+def scan_directory(directory: str, standard_text: str):
+    """Посты из медиафайлов каталога: по одному на файл, в порядке имён
+
+    Подпись берётся из одноимённого .txt рядом с файлом (cat.jpg -> cat.txt).
+    Посты возвращаются без времени, как и из манифеста.
+    """
+    posts = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        stem, ext = os.path.splitext(name)
+        kind = MEDIA_EXTENSIONS.get(ext.lower())
+        if kind is None or not os.path.isfile(path):
+            continue
+        caption = ""
+        caption_path = os.path.join(directory, stem + ".txt")
+        if os.path.isfile(caption_path):
+            with open(caption_path, encoding="utf-8-sig") as f:
+                caption = f.read().strip()
+        posts.append(build_post([Media(kind, path=path)], caption, None, standard_text))
+    return posts
@@ -0,0 +1,189 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import logging
+
+INTENT = "intent"
+DONE = "done"
+
+
+def _connect(path: str):
+    db = sqlite3.connect(path, isolation_level=None, timeout=10)
+    db.execute("PRAGMA journal_mode=WAL")
+    # FULL: отметка о публикации должна пережить падение процесса и питания
+    db.execute("PRAGMA synchronous=FULL")
+    return db
+
+
+class PublishLedger:
+    """Журнал публикаций: намерение и завершение для каждой пары (пост, канал)
+
+    Перед отправкой пишется intent, после успешной отправки — done. Если
+    процесс упал между ними, после перезапуска intent остаётся в журнале,
+    и повторная отправка пропускается: лучше потерять пост, чем опубликовать
+    его дважды.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS publish_ledger (
+            post_id TEXT NOT NULL,
+            channel TEXT NOT NULL,
+            state TEXT NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (post_id, channel)
+        );
+        CREATE INDEX IF NOT EXISTS publish_ledger_updated ON publish_ledger (updated);
+        CREATE TABLE IF NOT EXISTS published_media (
+            unique_id TEXT PRIMARY KEY,
+            post_id TEXT NOT NULL,
+            published REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS published_media_published ON published_media (published);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+
+    def open(self, keep_days: float = 7):
+        self._db = _connect(self.path)
+        self._db.executescript(self.SCHEMA)
+        # Старые записи больше не нужны: пост давно убран из очереди
+        expired = time.time() - keep_days * 86400
+        self._db.execute("DELETE FROM publish_ledger WHERE updated < ?", (expired,))
+        self._db.execute("DELETE FROM published_media WHERE published < ?", (expired,))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def state(self, post_id: str, channel):
+        row = self._db.execute(
+            "SELECT state FROM publish_ledger WHERE post_id = ? AND channel = ?", (post_id, str(channel))
+        ).fetchone()
+        return row[0] if row else None
+
+    def claim(self, post_id: str, channel) -> bool:
+        """Записать намерение отправить; False, если пара уже в журнале
+
+        Проверка и запись — один INSERT, поэтому два экземпляра не смогут
+        одновременно взяться за одну публикацию.
+        """
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO publish_ledger (post_id, channel, state, updated) VALUES (?, ?, ?, ?)",
+            (post_id, str(channel), INTENT, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def done(self, post_id: str, channel):
+        self._db.execute(
+            "UPDATE publish_ledger SET state = ?, updated = ? WHERE post_id = ? AND channel = ?",
+            (DONE, time.time(), post_id, str(channel)),
+        )
+
+    def clear(self, post_id: str, channel):
+        """Снять намерение: отправка точно не удалась, её можно повторить"""
+        self._db.execute(
+            "DELETE FROM publish_ledger WHERE post_id = ? AND channel = ? AND state = ?",
+            (post_id, str(channel), INTENT),
+        )
+
+    def remember_media(self, post_id: str, unique_ids, published: float):
+        """Записать file_unique_id медиа опубликованного поста (для поиска повторов)"""
+        self._db.executemany(
+            "INSERT OR REPLACE INTO published_media (unique_id, post_id, published) VALUES (?, ?, ?)",
+            [(unique_id, post_id, published) for unique_id in unique_ids],
+        )
+
+    def recent_media(self, limit: int):
+        """Последние limit опубликованных медиа: (file_unique_id, id поста, время), старые первыми"""
+        rows = self._db.execute(
+            "SELECT unique_id, post_id, published FROM published_media ORDER BY published DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return rows[::-1]
+
+
+class LeaderLease:
+    """Аренда роли ведущего в общей SQLite-базе
+
+    Публикует только экземпляр, владеющий строкой аренды. Ведущий продлевает
+    её каждые ttl/3 секунд; если он упал, через ttl секунд аренду забирает
+    другой экземпляр. При штатной остановке аренда освобождается сразу.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, name: str = "scheduler", ttl: float = 15):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._db = None
+
+    def _open(self):
+        if self._db is None:
+            self._db = _connect(self.path)
+            self._db.executescript(self.SCHEMA)
+
+    def try_acquire(self) -> bool:
+        """Захватить или продлить аренду; True, если мы ведущий"""
+        self._open()
+        now = time.time()
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "INSERT OR IGNORE INTO leases (name, holder, expires) VALUES (?, ?, 0)", (self.name, self.holder)
+            )
+            cursor = self._db.execute(
+                "UPDATE leases SET holder = ?, expires = ? WHERE name = ? AND (holder = ? OR expires < ?)",
+                (self.holder, now + self.ttl, self.name, self.holder, now),
+            )
+            self._db.execute("COMMIT")
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            logging.error(f"Ошибка аренды ведущего: {e}")
+            return False
+
+    def release(self):
+        if self._db is None:
+            return
+        self._db.execute("UPDATE leases SET expires = 0 WHERE name = ? AND holder = ?", (self.name, self.holder))
+        self.is_leader = False
+
+    async def hold(self, job, on_tick=None):
+        """Пока держим аренду — выполнять корутину job(), потеряли — отменить её
+
+        on_tick() вызывается на каждом продлении у любого экземпляра.
+        """
+        task = None
+        try:
+            while True:
+                leader = self.try_acquire()
+                if leader and not self.is_leader:
+                    logging.info(f"{self.holder} стал ведущим, запускаю планировщик")
+                    task = asyncio.create_task(job())
+                elif not leader and self.is_leader:
+                    logging.warning(f"{self.holder} потерял роль ведущего, останавливаю планировщик")
+                    task.cancel()
+                    task = None
+                self.is_leader = leader
+                if on_tick is not None:
+                    on_tick()
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            if task is not None:
+                task.cancel()
+            self.release()
@@ -1,33 +1,145 @@
 import os
-import json
+import io
+import time
+import heapq
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime
+from dataclasses import replace
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InputMediaPhoto, InputMediaVideo
+from aiogram.types import (
+    ReplyKeyboardMarkup, KeyboardButton, InputMediaPhoto, InputMediaVideo, FSInputFile, BufferedInputFile
+)
 from aiogram.enums import ParseMode
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramBadRequest, TelegramNetworkError, TelegramServerError, TelegramEntityTooLarge
+)
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from dotenv import load_dotenv
+from posts import Post, Media, MediaKind, format_time
+from storage import open_store, post_timestamp, append_archive
+from slots import SlotIndex
+from schedule import compile_rule
+from duplicates import QUEUED
+from albums import AlbumAggregator
+from settings import Config, ConfigStore
+from publisher import fan_out
+from sender import SendQueue, send_priority, request_not_sent, PRIORITY_CHANNEL
+from importer import manifest_format, parse_manifest, scan_directory, confined_path
+from media_cache import MediaCache
+from profiler import SamplingProfiler
+from webhook import serve_webhook
+from ledger import PublishLedger, LeaderLease, DONE
+from metrics import (
+    ApiMetrics, HandlerMetrics, start_metrics_server, PUBLISH_LAG, PUBLISH_FAILURES, OVERDUE_POSTS,
+    QUEUE_DEPTH, CATCH_UP_BACKLOG, SEND_QUEUE_DEPTH, STORAGE_SECONDS, DUPLICATE_MEDIA,
+)
+from fsm_storage import SqliteFSMStorage
+from tenants import (
+    TenantSpec, Tenant, TenantRegistry, TenantLocal, TenantMiddleware, load_registry, activate, using,
+    current as current_tenant,
+)
+from browser import PostsCallback, ReslotCallback, PAGE_SIZE, page_count, render_page, render_post, render_plan
 
 load_dotenv()
 
 # ========================================================================
 # ИНИЦИАЛИЗАЦИЯ
 # ========================================================================
-bot = Bot(
-    token=os.getenv("BOT_TOKEN"),
-    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-)
-dp = Dispatcher()
-
-# Поддержка нескольких администраторов
-ADMIN_IDS = [int(id_str.strip()) for id_str in os.getenv("ADMIN_IDS", "").split(",") if id_str.strip()]
-
 CONFIG_FILE = "config.json"
 POSTS_FILE = "posts.json"
+ARCHIVE_FILE = "archive.jsonl"
+LEDGER_FILE = "ledger.db"
+MEDIA_CACHE_FILE = "media_cache.db"
+
+# Реестр ботов для многоканального режима; без него работает один бот из BOT_TOKEN
+TENANTS_FILE = os.getenv("TENANTS_FILE") or ""
+
+# Профиль работающего бота по команде /profile или при запуске (PROFILE_ON_START)
+PROFILE_SECONDS = 30
+PROFILE_MAX_SECONDS = 600
+# Колбэк, занявший loop дольше этого, попадает в отчёт как медленный
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "100"))
+profile_jobs = set()
+
+# Одна HTTP-сессия (и пул соединений) на всех ботов процесса
+session = AiohttpSession()
+# Все исходящие запросы идут через общую очередь с учётом лимитов Telegram
+send_queue = SendQueue()
+session.middleware(send_queue)
+# Подключается после очереди, чтобы мерить сами запросы к API, а не ожидание в очереди
+session.middleware(ApiMetrics())
+
+# Состояния админов переживают перезапуск бота; ключи состояний включают id бота
+fsm_storage = SqliteFSMStorage(os.getenv("FSM_STORAGE") or "fsm.db")
+dp = Dispatcher(storage=fsm_storage)
+# Время работы хендлеров для метрик
+dp.message.middleware(HandlerMetrics())
+dp.callback_query.middleware(HandlerMetrics())
+
+# Аренда ведущего общая для всех экземпляров процесса (и всех его ботов):
+# публикует только ведущий
+lease = LeaderLease(os.getenv("LEDGER_PATH") or LEDGER_FILE, ttl=float(os.getenv("LEADER_TTL", "15")))
+
+def env_tenant() -> TenantSpec:
+    """Единственный бот из переменных окружения, файлы — в текущем каталоге"""
+    return TenantSpec(
+        name="default",
+        token=os.getenv("BOT_TOKEN"),
+        # Поддержка нескольких администраторов
+        admins=tuple(int(id_str.strip()) for id_str in os.getenv("ADMIN_IDS", "").split(",") if id_str.strip()),
+        channel_id=os.getenv("CHANNEL_ID") or "",
+        config_file=CONFIG_FILE,
+        posts_storage=os.getenv("POSTS_STORAGE") or POSTS_FILE,
+        ledger_file=os.getenv("LEDGER_PATH") or LEDGER_FILE,
+        media_cache_file=os.getenv("MEDIA_CACHE") or MEDIA_CACHE_FILE,
+        archive_file=ARCHIVE_FILE,
+        media_dir=os.getenv("MEDIA_DIR") or "",
+    )
+
+def open_tenant(spec: TenantSpec) -> Tenant:
+    """Объекты одного бота; файлы ещё не открываются (это делает start_tenant)"""
+    os.makedirs(spec.directory, exist_ok=True)
+    return Tenant(
+        name=spec.name,
+        admins=list(spec.admins),
+        bot=Bot(token=spec.token, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML)),
+        # Хранилище очереди: posts.json (по умолчанию) или SQLite, если путь оканчивается на .db
+        store=open_store(spec.path(spec.posts_storage)),
+        # Журнал публикаций общий для всех экземпляров бота: ни один пост не уходит в канал дважды
+        ledger=PublishLedger(spec.path(spec.ledger_file)),
+        # file_id уже загруженных локальных файлов (file_id у каждого бота свои)
+        media_cache=MediaCache(spec.path(spec.media_cache_file)),
+        # Настройки читаются из config.json один раз и кэшируются
+        config_store=ConfigStore(spec.path(spec.config_file), default=Config(channel_id=spec.channel_id)),
+        archive_file=spec.path(spec.archive_file),
+        # Каталог на сервере, из которого админы планируют посты командой /local
+        media_dir=spec.path(spec.media_dir) if spec.media_dir else "",
+    )
+
+specs = load_registry(TENANTS_FILE) if TENANTS_FILE else [env_tenant()]
+registry = TenantRegistry([open_tenant(spec) for spec in specs])
+dp.update.outer_middleware(TenantMiddleware(registry))
+if not TENANTS_FILE:
+    # С одним ботом он текущий везде, в том числе вне обработчиков
+    activate(next(iter(registry)))
+
+# Объекты текущего бота: того, чьё обновление обрабатывается или чей пост публикуется
+bot = TenantLocal("bot")
+ADMIN_IDS = TenantLocal("admins")
+store = TenantLocal("store")
+ledger = TenantLocal("ledger")
+media_cache = TenantLocal("media_cache")
+config_store = TenantLocal("config_store")
+# Индекс занятых слотов, обновляется при каждом добавлении/удалении поста
+slot_index = TenantLocal("slot_index")
+# Медиа в очереди и недавно опубликованные, по file_unique_id
+duplicates = TenantLocal("duplicates")
 
 # ========================================================================
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
@@ -35,67 +147,274 @@ POSTS_FILE = "posts.json"
 def is_admin(user_id: int) -> bool:
     return user_id in ADMIN_IDS
 
-def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        default = {
-            "channel_id": os.getenv("CHANNEL_ID") or "",
-            "publish_times": ["09:00", "13:00", "17:00", "21:00"],
-            "standard_text": "<b>Стандартный</b> текст"
-        }
-        save_config(default)
-        return default
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_config(data):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def load_posts():
-    if not os.path.exists(POSTS_FILE):
+def load_config() -> Config:
+    """Текущие настройки (из кэша; файл перечитывается только при изменении)"""
+    return config_store.get()
+
+def save_config(config: Config):
+    config_store.save(config)
+
+def get_next_publish_time() -> int:
+    """Следующее свободное время для публикации, секунды epoch"""
+    return int(slot_index.next_free().timestamp())
+
+def enqueue_post(post):
+    """Добавить пост в очередь, индекс слотов и планировщик"""
+    store.add(post)
+    slot_index.add(post_timestamp(post))
+    duplicates.add(post)
+    scheduler.schedule(post)
+
+def enqueue_many(posts):
+    """Поставить пачку постов в очередь: слоты одним проходом, сохранение одной записью
+
+    Посты с явным временем занимают его, повторяющиеся встают на первую сработку
+    своего правила, остальные получают ближайшие свободные слоты по порядку.
+    Возвращает посты с назначенным временем.
+    """
+    now = time.time()
+    posts = [
+        replace(post, ts=compile_rule(post.repeat).next_after(now)) if post.repeat and post.ts is None else post
+        for post in posts
+    ]
+    # Явное время занимаем заранее, чтобы свободные слоты его обходили
+    for post in posts:
+        if post.ts is not None:
+            slot_index.add(post.ts)
+    slots = iter(slot_index.next_free_many(sum(post.ts is None for post in posts)))
+    assigned = []
+    for i, post in enumerate(posts):
+        if post.ts is None:
+            posts[i] = post = replace(post, ts=int(next(slots).timestamp()))
+            assigned.append(post.ts)
+    for ts in assigned:
+        slot_index.add(ts)
+    store.add_many(posts)
+    for post in posts:
+        duplicates.add(post)
+        scheduler.schedule(post)
+    return posts
+
+def dequeue_post(post_id):
+    """Убрать пост из очереди (после публикации или удаления)"""
+    post = store.remove(post_id)
+    if post is not None:
+        slot_index.remove(post_timestamp(post))
+        duplicates.remove(post)
+    return post
+
+def reschedule_post(post, ts: int):
+    """Перенести пост на другое время"""
+    slot_index.remove(post_timestamp(post))
+    post = replace(post, ts=ts)
+    store.replace(post)
+    slot_index.add(post_timestamp(post))
+    scheduler.schedule(post)
+    return post
+
+def fixed_in_place(post) -> bool:
+    """Посты, которые перенос очереди не трогает: повторяющиеся и частично доставленные"""
+    return bool(post.repeat or post.delivered)
+
+def plan_reslot(schedule):
+    """План переноса очереди на сетку schedule: [(пост, новое время)] для постов, чьё время меняется
+
+    Посты сохраняют порядок и встают подряд на ближайшие свободные слоты;
+    оставшиеся на месте занимают свои. Очередь уже отсортирована, так что это
+    один проход и один next_free_many по отдельному индексу — O(n log n).
+    """
+    index = SlotIndex()
+    index.set_schedule(schedule)
+    posts = []
+    for post in store:
+        if fixed_in_place(post):
+            index.add(post_timestamp(post))
+        else:
+            posts.append(post)
+    if not posts or not len(schedule):
         return []
-    try:
-        with open(POSTS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
+    plan = []
+    for post, slot in zip(posts, index.next_free_many(len(posts))):
+        ts = int(slot.timestamp())
+        if ts != post.ts:
+            plan.append((post, ts))
+    return plan
+
+def plan_compaction(freed_ts: int):
+    """План закрытия дырки после удаления: посты, идущие за ней подряд, сдвигаются на слот раньше"""
+    run = slot_index.run_after_gap(freed_ts)
+    if run is None:
         return []
+    start, end = (slot_index.slot_datetime(n).timestamp() for n in run)
+    offset = store.position(start)
+    plan = []
+    for post in store.page(offset, store.position(end) - offset):
+        n = slot_index.slot_for_ts(post_timestamp(post))
+        if n is None:
+            # Пост с явным временем между слотами остаётся на месте
+            continue
+        if fixed_in_place(post):
+            break
+        plan.append((post, int(slot_index.slot_datetime(n - 1).timestamp())))
+    return plan
 
-def save_posts(posts):
-    with open(POSTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(posts, f, ensure_ascii=False, indent=2)
+def apply_plan(plan):
+    """Перенести посты по плану одной записью в хранилище и перестроить индексы"""
+    store.replace_many([replace(post, ts=ts) for post, ts in plan])
+    slot_index.clear()
+    for post in store:
+        slot_index.add(post_timestamp(post))
+    scheduler.reload()
 
-def get_next_publish_time(times, existing_posts):
-    """Получаем следующее свободное время для публикации"""
-    now = datetime.now()
-    times = sorted([datetime.strptime(t, "%H:%M").time() for t in times])
-    
-    # Получаем все занятые времена
-    busy_times = set()
-    for post in existing_posts:
+def schedule_repeat(post, after: float) -> bool:
+    """Перенести повторяющийся пост на следующую сработку после after; False, если их больше нет"""
+    next_ts = compile_rule(post.repeat).next_after(after)
+    if next_ts is None:
+        return False
+    reschedule_post(replace(post, delivered=()), next_ts)
+    return True
+
+def find_duplicates(media, config: Config):
+    """Медиа, которые уже стоят в очереди или недавно вышли (если проверка включена)"""
+    if config.duplicate_policy == "allow":
+        return []
+    found = duplicates.check(media)
+    if found:
+        DUPLICATE_MEDIA.labels(config.duplicate_policy).inc(len(found))
+    return found
+
+def describe_duplicates(found) -> str:
+    """Где уже встречались повторные медиа: время поста в очереди или публикации"""
+    places = []
+    for duplicate in found:
+        if duplicate.where == QUEUED:
+            post = store.get(duplicate.post_id)
+            places.append(f"уже в очереди на {format_time(post.ts if post else None, tz=admin_tz())}")
+        else:
+            places.append(f"уже опубликовано {format_time(duplicate.published_at, tz=admin_tz())}")
+    return "; ".join(dict.fromkeys(places))
+
+def record_published(post: Post):
+    """Запомнить медиа опубликованного поста, чтобы ловить его повторную отправку"""
+    unique_ids = [m.unique_id for m in post.media if m.unique_id]
+    if unique_ids:
+        now = time.time()
+        duplicates.published(post, now)
+        ledger.remember_media(post.id, unique_ids, now)
+
+async def notify_admins(text: str):
+    """Отправить служебное сообщение всем администраторам"""
+    for admin_id in ADMIN_IDS:
         try:
-            post_time = datetime.strptime(post["time"], "%H:%M %d.%m.%Y")
-            busy_times.add(post_time.strftime("%H:%M %d.%m.%Y"))
-        except:
-            continue
-    
-    # Проверяем следующие 7 дней
-    for day in range(8):
-        current_date = now.date() + timedelta(days=day)
-        
-        for time in times:
-            publish_time = datetime.combine(current_date, time)
-            
-            # Пропускаем прошедшее время сегодня
-            if day == 0 and publish_time < now:
-                continue
-                
-            time_str = publish_time.strftime("%H:%M %d.%m.%Y")
-            if time_str not in busy_times:
-                return time_str
-    
-    # Если все времена заняты, возвращаем первое время через неделю
-    next_week = now.date() + timedelta(days=7)
-    return datetime.combine(next_week, times[0]).strftime("%H:%M %d.%m.%Y")
+            await bot.send_message(admin_id, text)
+        except Exception as e:
+            logging.error(f"Не удалось уведомить админа {admin_id}: {e}")
+
+async def run_profile(seconds: int, recipients):
+    """Снять профиль процесса и прислать отчёт файлом; recipients — пары (тенант, id чата)"""
+    profiler = SamplingProfiler(threshold=PROFILE_SLOW_MS / 1000)
+    await profiler.run(seconds)
+    report = await asyncio.to_thread(profiler.report)
+    document = BufferedInputFile(report.encode("utf-8"), filename=f"profile-{datetime.now():%Y%m%d-%H%M%S}.txt")
+    for tenant, chat_id in recipients:
+        try:
+            await tenant.bot.send_document(chat_id, document, caption=f"📊 Профиль: {profiler.summary()}")
+        except Exception as e:
+            logging.error(f"Не удалось отправить профиль {chat_id}: {e}")
+
+def start_profile(seconds: int, recipients):
+    """Запустить профилирование в фоне; задача живёт в profile_jobs до конца"""
+    job = asyncio.create_task(run_profile(seconds, recipients))
+    profile_jobs.add(job)
+    job.add_done_callback(profile_jobs.discard)
+
+def admin_tz():
+    """Часовой пояс, в котором админ видит и вводит время: пояс расписания слотов"""
+    return load_config().slot_schedule.tz
+
+def format_delay(seconds: float) -> str:
+    """Человекочитаемая длительность: 3 ч 5 мин, 42 с"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, _ = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    parts = [f"{days} д" if days else "", f"{hours} ч" if hours else "", f"{minutes} мин" if minutes else ""]
+    return " ".join(p for p in parts if p)
+
+def media_source(media: Media):
+    """file_id медиа или локальный файл для загрузки"""
+    if media.file_id:
+        return media.file_id
+    return FSInputFile(media.path)
+
+def build_media_group(post: Post):
+    """Медиагруппа альбома: подпись ставится только на первый элемент"""
+    media_group = []
+    for i, m in enumerate(post.media):
+        if m.kind is MediaKind.PHOTO:
+            media_group.append(InputMediaPhoto(
+                media=media_source(m), 
+                caption=post.text if i == 0 else None,
+                parse_mode=ParseMode.HTML
+            ))
+        else:
+            media_group.append(InputMediaVideo(
+                media=media_source(m), 
+                caption=post.text if i == 0 else None,
+                parse_mode=ParseMode.HTML
+            ))
+    return media_group
+
+async def send_post(chat_id, post: Post):
+    """Отправить пост в указанный чат
+
+    Локальные файлы, которые уже загружали, уходят по file_id из кэша;
+    остальные загружаются потоком, и их file_id запоминается.
+    """
+    post = await media_cache.resolve_post(post)
+    if post.type == "single":
+        media = post.media[0]
+        if media.kind is MediaKind.PHOTO:
+            sent = [await bot.send_photo(chat_id, media_source(media), caption=post.text, parse_mode=ParseMode.HTML)]
+        else:
+            sent = [await bot.send_video(chat_id, media_source(media), caption=post.text, parse_mode=ParseMode.HTML)]
+    elif post.type == "album":
+        sent = await bot.send_media_group(chat_id, build_media_group(post))
+    else:
+        await bot.send_message(chat_id, post.text, parse_mode=ParseMode.HTML)
+        return
+    await media_cache.remember_sent(post.media, sent)
+
+class OutcomeUnknown(Exception):
+    """Запрос мог дойти до Telegram, а мог и нет: повторять его нельзя"""
+
+def publication_key(post: Post) -> str:
+    """Ключ публикации в журнале: у повторяющегося поста своя запись на каждую сработку"""
+    return f"{post.id}@{post.ts}" if post.repeat else post.id
+
+async def publish_once(chat_id, post: Post):
+    """Отправить пост в канал не больше одного раза, даже при падениях и нескольких экземплярах"""
+    # Файлы читаются до записи в журнал: ошибка чтения не оставляет в нём следа
+    post = await media_cache.resolve_post(post)
+    key = publication_key(post)
+    if not ledger.claim(key, chat_id):
+        if ledger.state(key, chat_id) != DONE:
+            raise OutcomeUnknown(f"пост мог уйти в {chat_id} до сбоя")
+        return
+    try:
+        await send_post(chat_id, post)
+    except TelegramAPIError as e:
+        # Telegram отклонил запрос или соединение не установилось — пост точно не
+        # опубликован, повтор безопасен. После прочих сетевых ошибок и 5xx это
+        # неизвестно: запись остаётся, и повторной отправки не будет
+        if (isinstance(e, (TelegramNetworkError, TelegramServerError))
+                and not isinstance(e, TelegramEntityTooLarge) and not request_not_sent(e)):
+            raise OutcomeUnknown(f"неизвестно, дошёл ли пост в {chat_id}: {e}") from e
+        ledger.clear(key, chat_id)
+        raise
+    ledger.done(key, chat_id)
 
 # ========================================================================
 # СОСТОЯНИЯ
@@ -109,7 +428,7 @@ class ConfigState(StatesGroup):
     waiting_text = State()
 
 class ViewPostsState(StatesGroup):
-    viewing = State()
+    waiting_date = State()
 
 # ========================================================================
 # КЛАВИАТУРЫ
@@ -138,14 +457,6 @@ config_kb = ReplyKeyboardMarkup(
     resize_keyboard=True
 )
 
-view_kb = ReplyKeyboardMarkup(
-    keyboard=[
-        [KeyboardButton(text="◀️ Предыдущая"), KeyboardButton(text="Следующая ▶️")],
-        [KeyboardButton(text="Отменить ❌"), KeyboardButton(text="Готово ✅")]
-    ],
-    resize_keyboard=True
-)
-
 # ========================================================================
 # ХЕНДЛЕРЫ
 # ========================================================================
@@ -162,21 +473,15 @@ async def schedule_mode(message: types.Message, state: FSMContext):
         return await message.answer("Доступ запрещен!")
     
     config = load_config()
-    if not config.get("channel_id"):
+    if not config.targets:
         await message.answer("Сначала настройте канал в настройках!")
         return
     
-    posts = load_posts()
-    next_time = get_next_publish_time(config["publish_times"], posts)
-    
-    # Форматируем время для отображения
-    next_time_obj = datetime.strptime(next_time, "%H:%M %d.%m.%Y")
-    time_str = next_time_obj.strftime("%H:%M")
-    day_str = next_time_obj.strftime("%d.%m.%Y")
+    next_time = get_next_publish_time()
     
     await state.set_state(PostState.waiting_media)
     await message.answer(
-        f"⏰ Планирую пост на {time_str} {day_str}.\nОтправьте фото/видео/альбом (необходимо после альбома отправить любое текстовое сообщение).",
+        f"⏰ Планирую пост на {format_time(next_time, tz=admin_tz())}.\nОтправьте фото/видео/альбом или манифест .jsonl/.csv для массового импорта.",
         reply_markup=cancel_kb
     )
 
@@ -188,39 +493,60 @@ async def finish_schedule(message: types.Message, state: FSMContext):
     await state.clear()
     await message.answer("Режим отложки завершён ✅", reply_markup=main_kb)
 
-# Переменная для хранения данных об альбомах
-albums_data = {}
+async def commit_album(album_data):
+    """Сохранить собранный альбом в очередь и сообщить админу"""
+    config = load_config()
+    
+    media = tuple(album_data["media"])
+    found = find_duplicates(media, config)
+    if found and config.duplicate_policy == "reject":
+        return await bot.send_message(
+            album_data["chat_id"],
+            f"❌ Альбом не запланирован: {len(found)} из {len(media)} медиа {describe_duplicates(found)}",
+            reply_markup=cancel_kb
+        )
+    
+    post = Post(
+        ts=get_next_publish_time(),
+        text=(album_data["caption"] or "") + "\n\n" + config.standard_text,
+        media=media,
+    )
+    
+    enqueue_post(post)
+    
+    warning = f"\n⚠️ Повтор: {len(found)} из {len(media)} медиа {describe_duplicates(found)}" if found else ""
+    await bot.send_message(
+        album_data["chat_id"],
+        f"✅ Альбом ({len(post.media)} медиа) запланирован на {format_time(post.ts, tz=admin_tz())}{warning}\n"
+        f"⏰ Ожидаю пост на следующее доступное время: {format_time(get_next_publish_time(), tz=admin_tz())}",
+        reply_markup=cancel_kb
+    )
+
+# Альбом сохраняется сам, когда части перестают приходить
+for tenant in registry:
+    tenant.albums = AlbumAggregator(commit_album)
+albums = TenantLocal("albums")
 
 @dp.message(PostState.waiting_media, F.media_group_id)
-async def handle_album_start(message: types.Message, state: FSMContext):
-    """Начало получения альбома"""
+async def handle_album_part(message: types.Message, state: FSMContext):
+    """Часть альбома: копим в сборщике, не блокируя обработчик"""
     if not is_admin(message.from_user.id):
         return await message.answer("Доступ запрещен!")
     
-    media_group_id = message.media_group_id
-    
-    if media_group_id not in albums_data:
-        albums_data[media_group_id] = {
-            "media": [],
-            "caption": message.caption or "",
-            "created_at": datetime.now(),
-            "user_id": message.from_user.id
-        }
-    
-    # Добавляем медиа в альбом
     if message.photo:
-        albums_data[media_group_id]["media"].append({
-            "kind": "photo",
-            "file_id": message.photo[-1].file_id
-        })
+        media = Media(MediaKind.PHOTO, message.photo[-1].file_id, unique_id=message.photo[-1].file_unique_id)
     elif message.video:
-        albums_data[media_group_id]["media"].append({
-            "kind": "video", 
-            "file_id": message.video.file_id
-        })
+        media = Media(MediaKind.VIDEO, message.video.file_id, unique_id=message.video.file_unique_id)
+    else:
+        return
     
-    # Ждем немного, чтобы получить все медиа из альбома
-    await asyncio.sleep(1)
+    albums.add(
+        message.media_group_id,
+        user_id=message.from_user.id,
+        chat_id=message.chat.id,
+        media=media,
+        caption=message.caption or ""
+    )
 
 @dp.message(PostState.waiting_media, F.content_type.in_({"photo", "video"}))
 async def handle_single_media(message: types.Message, state: FSMContext):
@@ -233,114 +559,126 @@ async def handle_single_media(message: types.Message, state: FSMContext):
         return
     
     config = load_config()
-    posts = load_posts()
-    
-    publish_time = get_next_publish_time(config["publish_times"], posts)
-    
-    post = {
-        "time": publish_time,
-        "type": "single",
-        "media": [{
-            "kind": "photo" if message.content_type == "photo" else "video",
-            "file_id": message.photo[-1].file_id if message.content_type == "photo" else message.video.file_id
-        }],
-        "caption": (message.caption or "") + "\n\n" + config["standard_text"]
-    }
     
-    posts.append(post)
-    save_posts(posts)
+    if message.content_type == "photo":
+        media = Media(MediaKind.PHOTO, message.photo[-1].file_id, unique_id=message.photo[-1].file_unique_id)
+    else:
+        media = Media(MediaKind.VIDEO, message.video.file_id, unique_id=message.video.file_unique_id)
+    found = find_duplicates((media,), config)
+    if found and config.duplicate_policy == "reject":
+        return await message.answer(
+            f"❌ Пост не запланирован: это медиа {describe_duplicates(found)}", reply_markup=cancel_kb
+        )
     
-    # Форматируем время для отображения
-    publish_time_obj = datetime.strptime(publish_time, "%H:%M %d.%m.%Y")
-    time_str = publish_time_obj.strftime("%H:%M")
-    day_str = publish_time_obj.strftime("%d.%m.%Y")
+    post = Post(
+        ts=get_next_publish_time(),
+        text=(message.caption or "") + "\n\n" + config.standard_text,
+        media=(media,),
+    )
     
-    next_time = get_next_publish_time(config["publish_times"], posts)
-    next_time_obj = datetime.strptime(next_time, "%H:%M %d.%m.%Y")
-    next_time_str = next_time_obj.strftime("%H:%M %d.%m.%Y")
+    enqueue_post(post)
     
+    warning = f"\n⚠️ Повтор: это медиа {describe_duplicates(found)}" if found else ""
     await message.answer(
-        f"✅ Пост запланирован на {time_str} {day_str}\n"
-        f"⏰ Ожидаю пост на следующее доступное время: {next_time_str}",
+        f"✅ Пост запланирован на {format_time(post.ts, tz=admin_tz())}{warning}\n"
+        f"⏰ Ожидаю пост на следующее доступное время: {format_time(get_next_publish_time(), tz=admin_tz())}",
         reply_markup=cancel_kb
     )
 
-@dp.message(PostState.waiting_media)
-async def handle_text_or_album_completion(message: types.Message, state: FSMContext):
-    """Обработчик текстовых сообщений и завершения альбомов"""
+def local_media_dir(subdir: str) -> str:
+    """Каталог внутри MEDIA_DIR; выйти за его пределы нельзя"""
+    directory = confined_path(current_tenant().media_dir, subdir)
+    if directory is None or not os.path.isdir(directory):
+        raise ValueError(f"каталог {subdir or '.'} не найден в MEDIA_DIR")
+    return directory
+
+@dp.message(Command("local"))
+async def schedule_local_media(message: types.Message, command: CommandObject):
+    """Поставить в очередь все медиафайлы из каталога на сервере: /local [подкаталог]"""
     if not is_admin(message.from_user.id):
         return await message.answer("Доступ запрещен!")
     
-    # Сначала проверяем, есть ли необработанные альбомы для этого пользователя
-    current_time = datetime.now()
-    user_albums = {k: v for k, v in albums_data.items() if v["user_id"] == message.from_user.id}
+    if not current_tenant().media_dir:
+        return await message.answer("❌ Каталог локальных медиа не настроен (MEDIA_DIR)")
+    config = load_config()
+    try:
+        directory = local_media_dir((command.args or "").strip())
+        posts = await asyncio.to_thread(scan_directory, directory, config.standard_text)
+    except (OSError, ValueError) as e:
+        return await message.answer(f"❌ {e}")
+    if not posts:
+        return await message.answer("В каталоге нет фото и видео")
     
-    for media_group_id, album_data in list(user_albums.items()):
-        # Проверяем, прошло ли достаточно времени с момента создания альбома
-        if (current_time - album_data["created_at"]).total_seconds() > 2 and album_data["media"]:
-            # Обрабатываем альбом
-            config = load_config()
-            posts = load_posts()
-            
-            publish_time = get_next_publish_time(config["publish_times"], posts)
-            
-            post = {
-                "time": publish_time,
-                "type": "album",
-                "media": album_data["media"],
-                "caption": (album_data["caption"] or "") + "\n\n" + config["standard_text"]
-            }
-            
-            posts.append(post)
-            save_posts(posts)
-            
-            # Форматируем время для отображения
-            publish_time_obj = datetime.strptime(publish_time, "%H:%M %d.%m.%Y")
-            time_str = publish_time_obj.strftime("%H:%M")
-            day_str = publish_time_obj.strftime("%d.%m.%Y")
-            
-            next_time = get_next_publish_time(config["publish_times"], posts)
-            next_time_obj = datetime.strptime(next_time, "%H:%M %d.%m.%Y")
-            next_time_str = next_time_obj.strftime("%H:%M %d.%m.%Y")
-            
-            await message.answer(
-                f"✅ Альбом ({len(album_data['media'])} медиа) запланирован на {time_str} {day_str}\n"
-                f"⏰ Ожидаю пост на следующее доступное время: {next_time_str}",
-                reply_markup=cancel_kb
-            )
-            
-            # Удаляем обработанный альбом
-            del albums_data[media_group_id]
-            return
+    # Файлы, которые уже загружали, сразу получают file_id (и file_unique_id для проверки повторов)
+    posts = [await media_cache.resolve_post(post) for post in posts]
+    repeated = [post for post in posts if find_duplicates(post.media, config)]
+    if config.duplicate_policy == "reject":
+        posts = [post for post in posts if post not in repeated]
+    
+    lines = []
+    if posts:
+        posts = enqueue_many(posts)
+        lines.append(
+            f"📂 Запланировано файлов: {len(posts)}, "
+            f"с {format_time(min(post.ts for post in posts), tz=admin_tz())} по {format_time(max(post.ts for post in posts), tz=admin_tz())}"
+        )
+    if repeated:
+        action = "пропущено" if config.duplicate_policy == "reject" else "запланировано всё равно"
+        lines.append(f"⚠️ Уже были в очереди или публиковались: {len(repeated)} ({action})")
+    await message.answer("\n".join(lines))
+
+@dp.message(PostState.waiting_media, F.document)
+async def handle_manifest(message: types.Message, state: FSMContext):
+    """Массовый импорт постов из манифеста .jsonl или .csv"""
+    if not is_admin(message.from_user.id):
+        return await message.answer("Доступ запрещен!")
+    
+    fmt = manifest_format(message.document.file_name)
+    if fmt is None:
+        return await message.answer("❌ Для массового импорта пришлите манифест .jsonl или .csv")
+    
+    config = load_config()
+    started = time.perf_counter()
+    data = await bot.download(message.document)
+    # Разбираем построчно, не склеивая файл в одну строку
+    posts, errors = parse_manifest(
+        io.TextIOWrapper(data, encoding="utf-8-sig", newline=""), fmt, config.standard_text,
+        current_tenant().media_dir, config.slot_schedule.tz
+    )
+    if posts:
+        posts = enqueue_many(posts)
+    elapsed = time.perf_counter() - started
+    
+    lines = [f"📥 Импортировано постов: {len(posts)} за {elapsed:.1f} с"]
+    if posts:
+        first = min(post.ts for post in posts)
+        last = max(post.ts for post in posts)
+        lines.append(f"⏰ Публикации с {format_time(first, tz=admin_tz())} по {format_time(last, tz=admin_tz())}")
+        lines.append(f"Ожидаю пост на следующее доступное время: {format_time(get_next_publish_time(), tz=admin_tz())}")
+    if errors:
+        lines.append(f"❌ Пропущено строк с ошибками: {len(errors)}")
+        lines.extend(errors[:10])
+        if len(errors) > 10:
+            lines.append("…")
+    await message.answer("\n".join(lines), reply_markup=cancel_kb)
+
+@dp.message(PostState.waiting_media)
+async def handle_text(message: types.Message, state: FSMContext):
+    """Обработчик текстовых сообщений"""
+    if not is_admin(message.from_user.id):
+        return await message.answer("Доступ запрещен!")
     
     # Если это просто текстовое сообщение
     if message.text and not message.media_group_id:
         config = load_config()
-        posts = load_posts()
-        
-        publish_time = get_next_publish_time(config["publish_times"], posts)
-        
-        post = {
-            "time": publish_time,
-            "type": "text",
-            "text": message.text + "\n\n" + config["standard_text"]
-        }
         
-        posts.append(post)
-        save_posts(posts)
+        post = Post(ts=get_next_publish_time(), text=message.text + "\n\n" + config.standard_text)
         
-        # Форматируем время для отображения
-        publish_time_obj = datetime.strptime(publish_time, "%H:%M %d.%m.%Y")
-        time_str = publish_time_obj.strftime("%H:%M")
-        day_str = publish_time_obj.strftime("%d.%m.%Y")
-        
-        next_time = get_next_publish_time(config["publish_times"], posts)
-        next_time_obj = datetime.strptime(next_time, "%H:%M %d.%m.%Y")
-        next_time_str = next_time_obj.strftime("%H:%M %d.%m.%Y")
+        enqueue_post(post)
         
         await message.answer(
-            f"✅ Текст запланирован на {time_str} {day_str}\n"
-            f"⏰ Ожидаю пост на следующее доступное время: {next_time_str}",
+            f"✅ Текст запланирован на {format_time(post.ts, tz=admin_tz())}\n"
+            f"⏰ Ожидаю пост на следующее доступное время: {format_time(get_next_publish_time(), tz=admin_tz())}",
             reply_markup=cancel_kb
         )
 
@@ -349,97 +687,98 @@ async def list_posts(message: types.Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return await message.answer("Доступ запрещен!")
     
-    posts = load_posts()
-    if not posts:
+    if not len(store):
         return await message.answer("Нет запланированных постов.")
     
-    await state.set_state(ViewPostsState.viewing)
-    await state.update_data(index=0)
-    await show_post(message.chat.id, 0)
+    await state.clear()
+    text, keyboard = browser_page(0)
+    await message.answer(text, reply_markup=keyboard)
 
-@dp.message(ViewPostsState.viewing, F.text == "Следующая ▶️")
-async def next_post(message: types.Message, state: FSMContext):
-    if not is_admin(message.from_user.id):
-        return await message.answer("Доступ запрещен!")
-    
-    data = await state.get_data()
-    idx = min(len(load_posts()) - 1, data.get("index", 0) + 1)
-    await state.update_data(index=idx)
-    await show_post(message.chat.id, idx)
+def browser_page(page: int):
+    """Страница списка постов; номер страницы ограничивается текущей длиной очереди"""
+    total = len(store)
+    page = min(max(0, page), page_count(total) - 1)
+    return render_page(store.page(page * PAGE_SIZE, PAGE_SIZE), page, total, admin_tz())
 
-@dp.message(ViewPostsState.viewing, F.text == "◀️ Предыдущая")
-async def prev_post(message: types.Message, state: FSMContext):
-    if not is_admin(message.from_user.id):
-        return await message.answer("Доступ запрещен!")
-    
-    data = await state.get_data()
-    idx = max(0, data.get("index", 0) - 1)
-    await state.update_data(index=idx)
-    await show_post(message.chat.id, idx)
+async def edit_browser(chat_id: int, message_id: int, text: str, keyboard):
+    """Перерисовать сообщение просмотра на месте"""
+    try:
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        # Повторное нажатие той же кнопки — не ошибка
+        if "message is not modified" not in str(e):
+            raise
 
-@dp.message(ViewPostsState.viewing, F.text == "Отменить ❌")
-async def delete_post(message: types.Message, state: FSMContext):
-    if not is_admin(message.from_user.id):
-        return await message.answer("Доступ запрещен!")
+@dp.callback_query(PostsCallback.filter())
+async def browse_posts(callback: types.CallbackQuery, callback_data: PostsCallback, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        return await callback.answer("Доступ запрещен!", show_alert=True)
     
-    data = await state.get_data()
-    idx = data.get("index", 0)
-    posts = load_posts()
+    action, page = callback_data.action, callback_data.page
+    if action == "close":
+        await callback.message.delete()
+        return await callback.answer()
+    if action == "date":
+        await state.set_state(ViewPostsState.waiting_date)
+        await state.update_data(browser_message_id=callback.message.message_id)
+        await callback.answer()
+        return await callback.message.answer("Введите дату в формате ДД.ММ.ГГГГ или ДД.ММ:")
+    browser = (callback.message.chat.id, callback.message.message_id)
+    if action == "page":
+        await edit_browser(*browser, *browser_page(page))
+        return await callback.answer()
     
-    if 0 <= idx < len(posts):
-        posts.pop(idx)
-        save_posts(posts)
-        
-        if not posts:
-            await state.clear()
-            return await message.answer("Все посты удалены.", reply_markup=main_kb)
-        
-        idx = max(0, idx - 1)
-        await state.update_data(index=idx)
-        await show_post(message.chat.id, idx)
+    post = store.get(callback_data.post_id)
+    if post is None:
+        await edit_browser(*browser, *browser_page(page))
+        return await callback.answer("Пост уже опубликован или удалён", show_alert=True)
+    
+    if action == "preview":
+        await callback.answer()
+        return await show_post(callback.message.chat.id, post)
+    if action == "confirm":
+        dequeue_post(post.id)
+        await edit_browser(*browser, *browser_page(page))
+        await callback.answer("Пост удалён")
+        # Предлагаем подтянуть следующие посты на освободившийся слот
+        plan = plan_compaction(post.ts)
+        if plan:
+            text, keyboard = render_plan(plan, post.ts, admin_tz())
+            await callback.message.answer(text, reply_markup=keyboard)
+        return
+    
+    # open и delete: карточка поста, для delete — с подтверждением
+    position = store.position(post_timestamp(post))
+    await edit_browser(
+        *browser, *render_post(post, position, len(store), page, confirm_delete=action == "delete", tz=admin_tz())
+    )
+    await callback.answer()
 
-@dp.message(ViewPostsState.viewing, F.text == "Готово ✅")
-async def finish_view(message: types.Message, state: FSMContext):
+@dp.message(ViewPostsState.waiting_date, F.text)
+async def jump_to_date(message: types.Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return await message.answer("Доступ запрещен!")
     
+    text = message.text.strip()
+    # Дата — в часовом поясе расписания (timezone в настройках), как и время в списке
+    tz = admin_tz()
+    try:
+        day = datetime.strptime(text, "%d.%m.%Y")
+    except ValueError:
+        try:
+            day = datetime.strptime(f"{text}.{datetime.now(tz).year}", "%d.%m.%Y")
+        except ValueError:
+            return await message.answer("Неверный формат даты. Пример: 25.12.2030")
+    
+    data = await state.get_data()
     await state.clear()
-    await message.answer("Возврат в меню ✅", reply_markup=main_kb)
+    page = store.position(day.replace(tzinfo=tz).timestamp()) // PAGE_SIZE
+    await edit_browser(message.chat.id, data["browser_message_id"], *browser_page(page))
 
-async def show_post(chat_id: int, idx: int):
-    posts = load_posts()
-    if idx >= len(posts):
-        return
-    
-    post = posts[idx]
-    await bot.send_message(chat_id, f"Пост на {post['time']}:")
-    
-    if post["type"] == "single":
-        media = post["media"][0]
-        if media["kind"] == "photo":
-            await bot.send_photo(chat_id, media["file_id"], caption=post["caption"], parse_mode=ParseMode.HTML)
-        else:
-            await bot.send_video(chat_id, media["file_id"], caption=post["caption"], parse_mode=ParseMode.HTML)
-    elif post["type"] == "album":
-        media_group = []
-        for i, m in enumerate(post["media"]):
-            if m["kind"] == "photo":
-                media_group.append(InputMediaPhoto(
-                    media=m["file_id"], 
-                    caption=post["caption"] if i == 0 else None,
-                    parse_mode=ParseMode.HTML
-                ))
-            else:
-                media_group.append(InputMediaVideo(
-                    media=m["file_id"], 
-                    caption=post["caption"] if i == 0 else None,
-                    parse_mode=ParseMode.HTML
-                ))
-        await bot.send_media_group(chat_id, media_group)
-    elif post["type"] == "text":
-        await bot.send_message(chat_id, post["text"], parse_mode=ParseMode.HTML)
-    
-    await bot.send_message(chat_id, f"Просмотр {idx+1}/{len(posts)}", reply_markup=view_kb)
+async def show_post(chat_id: int, post):
+    """Превью поста в чате админа"""
+    await bot.send_message(chat_id, f"Пост на {format_time(post.ts, tz=admin_tz())}:")
+    await send_post(chat_id, post)
 
 @dp.message(F.text == "Настройка ⚙️")
 async def settings_menu(message: types.Message):
@@ -447,13 +786,20 @@ async def settings_menu(message: types.Message):
         return await message.answer("Доступ запрещен!")
     
     config = load_config()
-    await message.answer(
-        f"<b>Текущие настройки:</b>\n"
-        f"<b>Канал:</b> {config['channel_id']}\n"
-        f"<b>Время:</b> {', '.join(config['publish_times'])}\n"
-        f"<b>Текст:</b> {config['standard_text']}",
-        reply_markup=config_kb
-    )
+    lines = [
+        "<b>Текущие настройки:</b>",
+        f"<b>Каналы:</b> {', '.join(config.targets)}",
+        f"<b>Время:</b> {', '.join(config.publish_times)}",
+    ]
+    # Расписание, даты без публикаций и часовой пояс задаются в config.json
+    if config.schedule:
+        lines.append(f"<b>Расписание:</b> {'; '.join(config.schedule)} (вместо времени)")
+    if config.blackout:
+        lines.append(f"<b>Без публикаций:</b> {', '.join(config.blackout)}")
+    if config.timezone:
+        lines.append(f"<b>Часовой пояс:</b> {config.timezone}")
+    lines.append(f"<b>Текст:</b> {config.standard_text}")
+    await message.answer("\n".join(lines), reply_markup=config_kb)
 
 @dp.message(F.text == "Изменить канал")
 async def change_channel(message: types.Message, state: FSMContext):
@@ -461,16 +807,17 @@ async def change_channel(message: types.Message, state: FSMContext):
         return await message.answer("Доступ запрещен!")
     
     await state.set_state(ConfigState.waiting_channel)
-    await message.answer("Отправьте новый ID канала:")
+    await message.answer("Отправьте ID канала (для кросс-постинга — несколько ID через запятую):")
 
 @dp.message(ConfigState.waiting_channel)
 async def set_channel(message: types.Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return await message.answer("Доступ запрещен!")
     
-    config = load_config()
-    config["channel_id"] = message.text.strip()
-    save_config(config)
+    channels = [c.strip() for c in message.text.split(",") if c.strip()]
+    if not channels:
+        return await message.answer("❌ Укажите хотя бы один канал")
+    save_config(replace(load_config(), channel_id=channels[0], channels=tuple(channels[1:])))
     await state.clear()
     await message.answer("✅ Канал изменён!", reply_markup=config_kb)
 
@@ -490,16 +837,78 @@ async def set_times(message: types.Message, state: FSMContext):
     try:
         times = [t.strip() for t in message.text.split(",")]
         # Проверяем формат времени
-        for time in times:
-            datetime.strptime(time, "%H:%M")
-        
-        config = load_config()
-        config["publish_times"] = times
-        save_config(config)
-        await state.clear()
-        await message.answer("✅ Время публикаций изменено!", reply_markup=config_kb)
+        for value in times:
+            datetime.strptime(value, "%H:%M")
     except ValueError:
-        await message.answer("❌ Неверный формат времени. Используйте HH:MM")
+        return await message.answer("❌ Неверный формат времени. Используйте HH:MM")
+    
+    config = load_config()
+    try:
+        save_config(replace(config, publish_times=tuple(times)))
+    except ValueError as e:
+        return await message.answer(f"❌ {e}")
+    await state.clear()
+    if config.schedule:
+        # Слоты задают cron-правила, время публикаций сейчас ни на что не влияет
+        return await message.answer(
+            "⚠️ Время сохранено, но слоты сейчас задаёт schedule в config.json: "
+            "новое время начнёт действовать, когда schedule будет пуст",
+            reply_markup=config_kb
+        )
+    await message.answer("✅ Время публикаций изменено!", reply_markup=config_kb)
+    
+    # Посты в очереди остались на старых временах: предлагаем перенести
+    plan = plan_reslot(load_config().slot_schedule)
+    if plan:
+        text, keyboard = render_plan(plan, tz=admin_tz())
+        await message.answer(text, reply_markup=keyboard)
+
+@dp.message(Command("reslot"))
+async def reslot_queue(message: types.Message):
+    """Перенести очередь на слоты текущего расписания, без дырок, с превью"""
+    if not is_admin(message.from_user.id):
+        return await message.answer("Доступ запрещен!")
+    
+    plan = plan_reslot(load_config().slot_schedule)
+    if not plan:
+        return await message.answer("Очередь уже стоит на слотах расписания без пропусков")
+    text, keyboard = render_plan(plan, tz=admin_tz())
+    await message.answer(text, reply_markup=keyboard)
+
+@dp.message(Command("profile"))
+async def profile_bot(message: types.Message, command: CommandObject):
+    """Профиль event loop работающего бота: /profile [секунды]"""
+    if not is_admin(message.from_user.id):
+        return await message.answer("Доступ запрещен!")
+    
+    try:
+        seconds = int(command.args or PROFILE_SECONDS)
+    except ValueError:
+        return await message.answer("❌ Укажите длительность в секундах, например <code>/profile 30</code>")
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        return await message.answer(f"❌ Длительность — от 1 до {PROFILE_MAX_SECONDS} секунд")
+    if profile_jobs:
+        return await message.answer("⏳ Профилирование уже идёт, дождитесь отчёта")
+    start_profile(seconds, [(current_tenant(), message.chat.id)])
+    await message.answer(f"⏱ Снимаю профиль {seconds} с, отчёт пришлю файлом")
+
+@dp.callback_query(ReslotCallback.filter())
+async def apply_reslot(callback: types.CallbackQuery, callback_data: ReslotCallback):
+    if not is_admin(callback.from_user.id):
+        return await callback.answer("Доступ запрещен!", show_alert=True)
+    
+    if callback_data.action == "cancel":
+        await callback.message.edit_text("Очередь оставлена как есть.")
+        return await callback.answer()
+    # План считается заново: после превью очередь могла измениться
+    if callback_data.ts:
+        plan = plan_compaction(callback_data.ts)
+    else:
+        plan = plan_reslot(load_config().slot_schedule)
+    if plan:
+        apply_plan(plan)
+    await callback.message.edit_text(f"✅ Перенесено постов: {len(plan)}")
+    await callback.answer()
 
 @dp.message(F.text == "Изменить текст публикации")
 async def change_text(message: types.Message, state: FSMContext):
@@ -514,9 +923,7 @@ async def set_text(message: types.Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return await message.answer("Доступ запрещен!")
     
-    config = load_config()
-    config["standard_text"] = message.text
-    save_config(config)
+    save_config(replace(load_config(), standard_text=message.text))
     await state.clear()
     await message.answer("✅ Текст изменён!", reply_markup=config_kb)
 
@@ -531,87 +938,406 @@ async def back_to_menu(message: types.Message, state: FSMContext):
 # ========================================================================
 # ПЛАНИРОВЩИК
 # ========================================================================
-async def scheduler_task():
-    """Задача для планировщика публикаций"""
-    while True:
+class Scheduler:
+    """Планировщик: спит ровно до ближайшей публикации вместо опроса по таймеру
+
+    Один на все боты процесса: в куче лежат посты всех тенантов, и каждый
+    пост обрабатывается в контексте своего тенанта. Наступившие посты
+    тенанта публикуются отдельной задачей, поэтому медленный тенант (RetryAfter,
+    большая загрузка) не задерживает остальных, и их посты не становятся
+    просроченными; пачки одного тенанта идут строго по очереди.
+    """
+
+    # Пост считается актуальным, если с момента его времени прошло меньше минуты
+    PUBLISH_WINDOW = 60
+    # Верхняя граница сна на случай перевода системных часов
+    MAX_SLEEP = 3600
+    # Пауза перед повторной попыткой после ошибки отправки
+    RETRY_DELAY = 10
+    # После стольких неудачных попыток пост уходит в архив
+    MAX_FAILURES = 5
+
+    def __init__(self):
+        self._heap = []  # (время срабатывания, id поста, время поста в секундах epoch, имя тенанта)
+        self._wakeup = asyncio.Event()
+        self._reload = True
+        self._failures = {}  # id поста -> число неудачных попыток
+        # Просроченные посты (имя тенанта, id поста, время поста), которые публикуются с ограничением скорости
+        self._backlog = deque()
+        self._next_catch_up = 0.0
+        # Последняя запущенная пачка каждого тенанта: следующая ждёт её завершения
+        self._batches = {}  # имя тенанта -> asyncio.Task
+        # Посты, которые сейчас публикуются: при перестройке кучи их не ставим повторно
+        self._in_flight = set()  # (имя тенанта, id поста)
+
+    def schedule(self, post, fire_at: float = None):
+        """Поставить пост текущего тенанта в очередь и разбудить планировщик, если он теперь первый"""
+        # Пока канал не настроен, посты тенанта ждут: reload() подхватит их после настройки
+        if post.ts is None or not (post.channels or load_config().targets):
+            return
+        entry = (fire_at or post.ts, post.id, post.ts, current_tenant().name)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def reload(self):
+        """Перестроить очередь целиком (при старте и смене настроек)"""
+        self._reload = True
+        self._wakeup.set()
+
+    def _rebuild(self):
+        self._heap.clear()
+        self._reload = False
+        # Догоняющая очередь переживает перестройку: иначе её посты снова окажутся
+        # просроченными, и админы получат отчёт о них ещё раз. Выбывают только
+        # удалённые и перенесённые посты и посты тенантов, у которых не осталось каналов
+        backlog = deque()
+        for name, post_id, post_ts in self._backlog:
+            # Чтение настроек может их перезагрузить, а подписчики работают с текущим тенантом
+            with using(registry.get(name)):
+                post = store.get(post_id)
+                if post is not None and post.ts == post_ts and (post.channels or load_config().targets):
+                    backlog.append((name, post_id, post_ts))
+        self._backlog = backlog
+        waiting = {(name, post_id) for name, post_id, _ in backlog} | self._in_flight
+        for tenant in registry:
+            with using(tenant):
+                for post in store:
+                    if (tenant.name, post.id) not in waiting:
+                        self.schedule(post)
+
+    async def _sleep(self, timeout):
         try:
-            now = datetime.now()
-            posts = load_posts()
-            config = load_config()
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _pop_due(self, now: float):
+        """Снять с кучи все наступившие записи: {тенант: (актуальные, просроченные) посты}"""
+        found = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, post_id, post_ts, name = heapq.heappop(self._heap)
+            tenant = registry.get(name)
+            post = tenant.store.get(post_id)
+            # Удалённые и перенесённые посты отбрасываем здесь, а не при изменении
+            if post is None or post.ts != post_ts:
+                continue
+            due, overdue = found.setdefault(tenant, ({}, {}))
+            # Повторные попытки после ошибки не считаем опозданием
+            if now - post_ts < self.PUBLISH_WINDOW or post_id in self._failures:
+                due[post_id] = post
+            else:
+                overdue[post_id] = post
+        return {tenant: (list(due.values()), list(overdue.values())) for tenant, (due, overdue) in found.items()}
+
+    def _retry(self, post, delay: float):
+        """Повторить попытку позже или отправить пост в архив после MAX_FAILURES"""
+        failures = self._failures.get(post.id, 0) + 1
+        if failures >= self.MAX_FAILURES:
+            self._failures.pop(post.id, None)
+            if post.repeat and schedule_repeat(post, time.time()):
+                logging.error(f"Повтор поста на {format_time(post.ts, tz=admin_tz())} не опубликован после {failures} попыток, пропущен")
+                return
+            dequeue_post(post.id)
+            append_archive(current_tenant().archive_file, [post], "failed")
+            logging.error(f"Пост на {format_time(post.ts, tz=admin_tz())} не опубликован после {failures} попыток, перенесён в архив")
+            return
+        self._failures[post.id] = failures
+        self.schedule(post, time.time() + delay)
+
+    async def _publish_due(self, posts):
+        config = load_config()
+        for post in posts:
+            # Пост может быть адресован своим каналам; уже доставленные пропускаем
+            channels = [c for c in (post.channels or config.targets) if c not in post.delivered]
+            try:
+                post = await media_cache.resolve_post(post)
+            except Exception as e:
+                # Локальный файл пропал или не читается: это ошибка одного поста, а не всей пачки
+                PUBLISH_FAILURES.inc(len(channels))
+                logging.error(f"Не удалось подготовить медиа поста на {format_time(post.ts, tz=admin_tz())}: {e}")
+                self._retry(post, self.RETRY_DELAY)
+                continue
+            # Посты в каналы обгоняют в очереди отправки ответы админам
+            with send_priority(PRIORITY_CHANNEL):
+                if any(not m.file_id for m in post.media):
+                    # Локальные файлы ещё не загружены: их загружает первый канал, а остальные
+                    # send_post отправит уже по file_id из кэша, а не тем же файлом ещё раз
+                    results = await fan_out(publish_once, post, channels[:1], 1)
+                    results.update(await fan_out(publish_once, post, channels[1:], config.fanout_concurrency))
+                else:
+                    results = await fan_out(publish_once, post, channels, config.fanout_concurrency)
             
-            if not config.get("channel_id"):
-                await asyncio.sleep(60)
+            failed = {c: e for c, e in results.items() if e is not None}
+            PUBLISH_FAILURES.inc(len(failed))
+            for channel, e in failed.items():
+                logging.error(f"Ошибка публикации в {channel}: {e}")
+            
+            unknown = [c for c, e in failed.items() if isinstance(e, OutcomeUnknown)]
+            if unknown:
+                # Дошёл ли пост в эти каналы, неизвестно: опубликованным его не считаем,
+                # а сохраняем в архиве и зовём админов проверить каналы вручную
+                append_archive(current_tenant().archive_file, [post], "unknown")
+                await notify_admins(
+                    f"⚠️ Пост на {format_time(post.ts, tz=admin_tz())} мог не дойти в {', '.join(map(str, unknown))}: "
+                    f"повторно не отправлялся, проверьте каналы вручную"
+                )
+            confirmed = post.delivered + tuple(c for c in channels if c not in failed)
+            
+            if len(unknown) == len(failed):
+                if not failed:
+                    PUBLISH_LAG.observe(time.time() - post_timestamp(post))
+                if confirmed:
+                    record_published(post)
+                self._failures.pop(post.id, None)
+                # Повторяющийся пост переносим на следующую сработку, остальные удаляем
+                if not (post.repeat and schedule_repeat(post, max(post.ts, time.time()))):
+                    dequeue_post(post.id)
                 continue
-                
-            for post in posts[:]:
-                try:
-                    post_time = datetime.strptime(post["time"], "%H:%M %d.%m.%Y")
-                    
-                    # Если время публикации наступило
-                    if now >= post_time and (now - post_time).total_seconds() < 60:
-                        try:
-                            if post["type"] == "single":
-                                media = post["media"][0]
-                                if media["kind"] == "photo":
-                                    await bot.send_photo(
-                                        config["channel_id"], 
-                                        media["file_id"], 
-                                        caption=post["caption"],
-                                        parse_mode=ParseMode.HTML
-                                    )
-                                else:
-                                    await bot.send_video(
-                                        config["channel_id"], 
-                                        media["file_id"], 
-                                        caption=post["caption"],
-                                        parse_mode=ParseMode.HTML
-                                    )
-                            elif post["type"] == "album":
-                                media_group = []
-                                for i, m in enumerate(post["media"]):
-                                    if m["kind"] == "photo":
-                                        media_group.append(InputMediaPhoto(
-                                            media=m["file_id"], 
-                                            caption=post["caption"] if i == 0 else None,
-                                            parse_mode=ParseMode.HTML
-                                        ))
-                                    else:
-                                        media_group.append(InputMediaVideo(
-                                            media=m["file_id"], 
-                                            caption=post["caption"] if i == 0 else None,
-                                            parse_mode=ParseMode.HTML
-                                        ))
-                                await bot.send_media_group(config["channel_id"], media_group)
-                            elif post["type"] == "text":
-                                await bot.send_message(
-                                    config["channel_id"],
-                                    post["text"],
-                                    parse_mode=ParseMode.HTML
-                                )
-                            
-                            # Удаляем опубликованный пост
-                            posts.remove(post)
-                            save_posts(posts)
-                            
-                        except Exception as e:
-                            logging.error(f"Ошибка публикации: {e}")
-                            
-                except Exception as e:
-                    logging.error(f"Ошибка обработки поста: {e}")
-                    
-            await asyncio.sleep(30)  # Проверяем каждые 30 секунд
             
+            # Запоминаем успешные каналы, чтобы при повторе не задублировать пост; каналы
+            # с неизвестным исходом тоже исключаем из повтора — о них уже знают админы
+            post = replace(post, delivered=confirmed + tuple(unknown))
+            store.replace(post)
+            self._retry(post, self.RETRY_DELAY)
+
+    # --------------------------------------------------------------------
+    # Догоняющий режим
+    # --------------------------------------------------------------------
+    async def _handle_overdue(self, posts, now: float):
+        """Применить политику catch_up_policy к постам, пропустившим своё время"""
+        config = load_config()
+        # Пропущенные сработки повторяющихся постов не догоняем: ждём следующую
+        for post in posts:
+            if post.repeat and not schedule_repeat(post, now):
+                dequeue_post(post.id)
+        posts = [post for post in posts if not post.repeat]
+        if not posts:
+            return
+        posts.sort(key=post_timestamp)
+        late = [now - post_timestamp(post) for post in posts]
+        OVERDUE_POSTS.labels(config.catch_up_policy).inc(len(posts))
+        
+        if config.catch_up_policy == "publish":
+            name = current_tenant().name
+            self._backlog.extend((name, post.id, post.ts) for post in posts)
+            action = f"будут опубликованы со скоростью {config.catch_up_rate:g} в минуту"
+        elif config.catch_up_policy == "reslot":
+            new_times = slot_index.next_free_many(len(posts))
+            for post, new_time in zip(posts, new_times):
+                reschedule_post(post, int(new_time.timestamp()))
+            action = f"перенесены на ближайшие свободные слоты (первый — {new_times[0].strftime('%H:%M %d.%m.%Y')})"
+        else:
+            for post in posts:
+                dequeue_post(post.id)
+            archive_file = current_tenant().archive_file
+            append_archive(archive_file, posts, "overdue")
+            action = f"перенесены в архив {os.path.basename(archive_file)}"
+        
+        report = (
+            f"⏳ Пропущено время публикации у {len(posts)} постов: {action}.\n"
+            f"Опоздание: максимум {format_delay(max(late))}, в среднем {format_delay(sum(late) / len(late))}."
+        )
+        logging.warning(report)
+        await notify_admins(report)
+
+    def _publish_backlog(self):
+        """Запустить публикацию одного просроченного поста из очереди догоняющего режима"""
+        while self._backlog:
+            name, post_id, post_ts = self._backlog.popleft()
+            tenant = registry.get(name)
+            with using(tenant):
+                post = store.get(post_id)
+                # Перенесённый пост уже стоит в куче на новом времени
+                if post is None or post.ts != post_ts:
+                    continue
+                late = time.time() - post_timestamp(post)
+                logging.info(f"Догоняющая публикация поста на {format_time(post.ts, tz=admin_tz())}, опоздание {format_delay(late)}")
+                self._start_batch(tenant, [post], [], time.time())
+                self._next_catch_up = time.time() + 60 / load_config().catch_up_rate
+                return
+        self._next_catch_up = time.time()
+
+    # --------------------------------------------------------------------
+    # Пачки тенантов
+    # --------------------------------------------------------------------
+    def _start_batch(self, tenant, due, overdue, now: float):
+        """Обработать наступившие посты тенанта отдельной задачей после его предыдущей пачки"""
+        keys = {(tenant.name, post.id) for post in due + overdue}
+        self._in_flight |= keys
+        batch = asyncio.create_task(self._run_batch(tenant, self._batches.get(tenant.name), due, overdue, now, keys))
+        self._batches[tenant.name] = batch
+        batch.add_done_callback(lambda task: self._forget_batch(tenant.name, task))
+
+    def _forget_batch(self, name: str, batch):
+        if self._batches.get(name) is batch:
+            del self._batches[name]
+
+    async def _run_batch(self, tenant, previous, due, overdue, now: float, keys):
+        try:
+            if previous is not None:
+                # wait, а не await: ошибка или отмена прошлой пачки не должна срывать эту
+                await asyncio.wait({previous})
+            with using(tenant):
+                if overdue:
+                    await self._handle_overdue(overdue, now)
+                if due:
+                    await self._publish_due(due)
         except Exception as e:
-            logging.error(f"Ошибка в планировщике: {e}")
-            await asyncio.sleep(60)
+            logging.error(f"Ошибка в планировщике ({tenant.name}): {e}")
+        finally:
+            self._in_flight -= keys
+
+    async def run(self):
+        try:
+            await self._run()
+        finally:
+            # Экземпляр перестал быть ведущим: начатые пачки публикует уже новый ведущий
+            for batch in list(self._batches.values()):
+                batch.cancel()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._reload:
+                    self._rebuild()
+
+                now = time.time()
+                for tenant, (due, overdue) in self._pop_due(now).items():
+                    self._start_batch(tenant, due, overdue, now)
+
+                if self._backlog and now >= self._next_catch_up:
+                    self._publish_backlog()
+                    continue
+
+                # Спим до ближайшего поста или следующей догоняющей публикации
+                wake_at = [self._heap[0][0]] if self._heap else []
+                if self._backlog:
+                    wake_at.append(self._next_catch_up)
+                if not wake_at:
+                    await self._sleep(None)
+                else:
+                    await self._sleep(min(max(0, min(wake_at) - time.time()), self.MAX_SLEEP))
+
+            except Exception as e:
+                logging.error(f"Ошибка в планировщике: {e}")
+                await asyncio.sleep(60)
+
+scheduler = Scheduler()
+
+def slot_settings(config: Config):
+    return config.publish_times, config.schedule, config.blackout, config.timezone
+
+def on_config_change(old, new):
+    """Перестроить зависящие от настроек индексы"""
+    if old is None or slot_settings(old) != slot_settings(new):
+        slot_index.set_schedule(new.slot_schedule)
+    if old is None or old.targets != new.targets:
+        scheduler.reload()
+    duplicates.history = new.duplicate_history
+
+def refresh_from_store():
+    """Подхватить посты, добавленные или удалённые другим экземпляром бота"""
+    for tenant in registry:
+        with using(tenant):
+            if not store.changed_externally():
+                continue
+            slot_index.clear()
+            duplicates.clear()
+            for post in store:
+                slot_index.add(post_timestamp(post))
+                duplicates.add(post)
+            # Публикации ведущего экземпляра видны только через журнал
+            duplicates.load_history(ledger.recent_media(duplicates.history))
+            scheduler.reload()
+
+async def run_scheduler():
+    # Пока экземпляр не был ведущим, его куча могла устареть
+    scheduler.reload()
+    await scheduler.run()
+
+async def scheduler_task():
+    """Задача для планировщика публикаций: работает, только пока экземпляр ведущий"""
+    await lease.hold(run_scheduler, on_tick=refresh_from_store)
 
 # ========================================================================
 # ЗАПУСК
 # ========================================================================
+def start_tenant():
+    """Открыть файлы текущего бота и построить его индексы"""
+    with STORAGE_SECONDS.labels("load").time():
+        store.load()
+    ledger.open()
+    media_cache.load()
+    slot_index.set_schedule(load_config().slot_schedule)
+    # Подписчик вызывается из save_config, то есть в контексте того же бота
+    config_store.subscribe(on_config_change)
+    duplicates.history = load_config().duplicate_history
+    duplicates.load_history(ledger.recent_media(duplicates.history))
+    for post in store:
+        slot_index.add(post_timestamp(post))
+        duplicates.add(post)
+
+async def stop_tenant():
+    """Дописать на диск всё, что ещё не успело сохраниться у текущего бота"""
+    await albums.flush()
+    await store.close()
+    ledger.close()
+    media_cache.close()
+
 async def main():
     """Основная функция"""
-    asyncio.create_task(scheduler_task())
-    await dp.start_polling(bot)
+    if os.getenv("WEBHOOK_PORT") and TENANTS_FILE:
+        raise RuntimeError("Вебхук поддерживается только с одним ботом: уберите TENANTS_FILE или WEBHOOK_PORT")
+    for tenant in registry:
+        with using(tenant):
+            start_tenant()
+    fsm_storage.load()
+    # Размеры очередей считаются только в момент запроса метрик
+    QUEUE_DEPTH.set_function(lambda: sum(len(tenant.store) for tenant in registry))
+    CATCH_UP_BACKLOG.set_function(lambda: len(scheduler._backlog))
+    SEND_QUEUE_DEPTH.set_function(lambda: len(send_queue))
+    metrics_runner = None
+    if os.getenv("METRICS_PORT"):
+        metrics_runner = await start_metrics_server(
+            os.getenv("METRICS_HOST", "127.0.0.1"), int(os.getenv("METRICS_PORT"))
+        )
+    scheduler_job = asyncio.create_task(scheduler_task())
+    if os.getenv("PROFILE_ON_START"):
+        # Профиль первых секунд работы: догоняющие публикации, накопившиеся обновления
+        start_profile(
+            int(os.getenv("PROFILE_ON_START")), [(tenant, admin) for tenant in registry for admin in tenant.admins]
+        )
+    try:
+        if os.getenv("WEBHOOK_PORT"):
+            # Вебхук вместо long polling: WEBHOOK_URL — публичный адрес для регистрации в Telegram
+            await serve_webhook(
+                dp, next(iter(registry)).bot,
+                url=os.getenv("WEBHOOK_URL", ""),
+                path=os.getenv("WEBHOOK_PATH", "/webhook"),
+                secret=os.getenv("WEBHOOK_SECRET", ""),
+                host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+                port=int(os.getenv("WEBHOOK_PORT")),
+                concurrency=int(os.getenv("WEBHOOK_CONCURRENCY", "100")),
+            )
+        else:
+            # Один цикл опроса на каждого бота, все — в одном диспетчере
+            await dp.start_polling(*[tenant.bot for tenant in registry])
+    finally:
+        scheduler_job.cancel()
+        for job in profile_jobs:
+            job.cancel()
+        # Дожидаемся отмены, чтобы аренда ведущего освободилась сразу
+        await asyncio.gather(scheduler_job, *profile_jobs, return_exceptions=True)
+        for tenant in registry:
+            with using(tenant):
+                await stop_tenant()
+        await send_queue.close()
+        await fsm_storage.close()
+        await session.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 if __name__ == "__main__":
     logging.basicConfig(
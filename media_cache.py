@@ -0,0 +1,102 @@
+import os
+import time
+import hashlib
+import sqlite3
+import asyncio
+from dataclasses import replace
+
+from posts import MediaKind
+
+# Размер блока при подсчёте хэша: большие видео не читаются в память целиком
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sent_file(message, kind: MediaKind):
+    """Файл из ответа Telegram на отправку медиа (у фото — самый большой размер)"""
+    if kind is MediaKind.PHOTO:
+        return message.photo[-1] if message.photo else None
+    # Короткое видео без звука Telegram может превратить в анимацию
+    return message.video or message.animation or message.document
+
+
+class MediaCache:
+    """file_id загруженных локальных файлов по sha256 их содержимого
+
+    Локальный файл загружается в Telegram один раз: file_id из ответа
+    запоминается, и следующие отправки того же содержимого (повторы,
+    превью, другие каналы) идут по file_id. Хэш файла считается вне event
+    loop и запоминается по пути, размеру и времени изменения.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS media_cache (
+            sha256 TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            unique_id TEXT,
+            uploaded REAL NOT NULL,
+            PRIMARY KEY (sha256, kind)
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._digests = {}  # (путь, размер, время изменения) -> sha256
+
+    def load(self):
+        self._db = sqlite3.connect(self.path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(self.SCHEMA)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def digest(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = self._digests[key] = await asyncio.to_thread(file_sha256, path)
+        return digest
+
+    async def resolve(self, media):
+        """Медиа с file_id из кэша, если этот файл уже загружали"""
+        if media.file_id or not media.path:
+            return media
+        row = self._db.execute(
+            "SELECT file_id, unique_id FROM media_cache WHERE sha256 = ? AND kind = ?",
+            (await self.digest(media.path), media.kind.value),
+        ).fetchone()
+        if row is None:
+            return media
+        return replace(media, file_id=row[0], unique_id=media.unique_id or row[1] or "")
+
+    async def resolve_post(self, post):
+        if not any(m.path and not m.file_id for m in post.media):
+            return post
+        return replace(post, media=tuple([await self.resolve(m) for m in post.media]))
+
+    async def remember_sent(self, media, messages):
+        """Запомнить file_id локальных файлов из ответов Telegram на их отправку"""
+        for m, message in zip(media, messages):
+            if m.file_id or not m.path:
+                continue
+            uploaded = sent_file(message, m.kind)
+            if uploaded is None:
+                continue
+            self._db.execute(
+                "INSERT OR REPLACE INTO media_cache (sha256, kind, file_id, unique_id, uploaded) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (await self.digest(m.path), m.kind.value, uploaded.file_id, uploaded.file_unique_id, time.time()),
+            )
@@ -0,0 +1,251 @@
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Registry:
+    """Набор метрик, отдаваемых в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children = {}
+        if not self.label_names:
+            # Метрика без меток видна в выдаче сразу, даже с нулевым значением
+            self.labels()
+        registry.register(self)
+
+    def labels(self, *values):
+        """Дочерняя метрика для конкретных значений меток; создаётся один раз"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _default(self):
+        return self.labels()
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def samples(self):
+        for values, child in self._children.items():
+            yield f"{self.name}{_labels(self.label_names, values)} {_number(child.value)}"
+
+
+class Gauge(_Metric):
+    """Значение, которое вычисляется функцией в момент запроса метрик
+
+    Так глубина очереди и прочие размеры ничего не стоят на горячем пути.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn=None, **kwargs):
+        super().__init__(name, help, **kwargs)
+        self.fn = fn
+
+    def _new_child(self):
+        return None
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                yield f"{self.name} {_number(self.fn())}"
+            except Exception as e:
+                logging.error(f"Не удалось посчитать метрику {self.name}: {e}")
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS, **kwargs):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, **kwargs)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def samples(self):
+        for values, child in self._children.items():
+            # Корзины копятся по отдельности, накопительные суммы считаются только здесь
+            total = 0
+            for bound, count in zip(self.bounds + (float("inf"),), child.counts):
+                total += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, values, [le])} {total}"
+            yield f"{self.name}_sum{_labels(self.label_names, values)} {child.sum!r}"
+            yield f"{self.name}_count{_labels(self.label_names, values)} {total}"
+
+
+# ========================================================================
+# МЕТРИКИ БОТА
+# ========================================================================
+PUBLISH_LAG = Histogram(
+    "autoposter_publish_lag_seconds", "Задержка фактической публикации относительно времени поста",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600, 21600, 86400),
+)
+OVERDUE_POSTS = Counter(
+    "autoposter_overdue_posts_total", "Посты, пропустившие своё время, по применённой политике", labels=("policy",)
+)
+PUBLISH_FAILURES = Counter("autoposter_publish_failures_total", "Неудачные публикации в канал")
+QUEUE_DEPTH = Gauge("autoposter_queue_depth", "Постов в очереди")
+CATCH_UP_BACKLOG = Gauge("autoposter_catch_up_backlog", "Просроченных постов в очереди догоняющего режима")
+API_LATENCY = Histogram(
+    "autoposter_api_request_seconds", "Длительность запросов к Bot API", labels=("method",)
+)
+API_ERRORS = Counter("autoposter_api_errors_total", "Ошибки запросов к Bot API", labels=("method", "error"))
+SEND_QUEUE_DEPTH = Gauge("autoposter_send_queue_depth", "Запросов в очереди отправки")
+STORAGE_SECONDS = Histogram(
+    "autoposter_storage_seconds", "Длительность загрузки и сохранения очереди", labels=("operation",)
+)
+ALBUM_WAIT = Histogram(
+    "autoposter_album_wait_seconds", "Время от первой части альбома до его сохранения",
+    buckets=(0.5, 1, 1.5, 2, 3, 5, 10, 30, 60),
+)
+HANDLER_LATENCY = Histogram(
+    "autoposter_handler_seconds", "Длительность обработки апдейтов", labels=("handler",)
+)
+DUPLICATE_MEDIA = Counter(
+    "autoposter_duplicate_media_total", "Повторно присланные медиа, по применённой политике", labels=("policy",)
+)
+
+
+class ApiMetrics(BaseRequestMiddleware):
+    """Middleware сессии: время и ошибки каждого запроса к Bot API
+
+    Регистрируется после SendQueue, поэтому меряет сам запрос, без ожидания
+    в очереди отправки; каждая повторная попытка — отдельное наблюдение.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        name = getattr(method, "__api_method__", type(method).__name__)
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            API_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+
+class HandlerMetrics(BaseMiddleware):
+    """Middleware диспетчера: время работы хендлеров по их именам"""
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+
+async def start_metrics_server(host: str = "127.0.0.1", port: int = 9100, registry: Registry = REGISTRY):
+    """Отдавать метрики по GET /metrics; вернуть runner для остановки"""
+
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,146 @@
+import uuid
+from enum import Enum
+from datetime import datetime
+from dataclasses import dataclass, field
+
+TIME_FORMAT = "%H:%M %d.%m.%Y"
+
+
+class MediaKind(str, Enum):
+    PHOTO = "photo"
+    VIDEO = "video"
+
+
+# Однобуквенные коды типов медиа в записи на диске
+KIND_CODES = {MediaKind.PHOTO: "p", MediaKind.VIDEO: "v"}
+CODE_KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex
+
+
+def parse_time(value: str, tz=None):
+    """Строка "HH:MM ДД.ММ.ГГГГ" в поясе tz (по умолчанию — сервера) -> секунды epoch
+
+    None, если строка пустая или битая.
+    """
+    try:
+        return int(datetime.strptime(value, TIME_FORMAT).replace(tzinfo=tz).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def format_time(ts, fmt: str = TIME_FORMAT, tz=None) -> str:
+    """Время для показа пользователю в поясе tz (по умолчанию — сервера)
+
+    В самих постах хранятся только секунды epoch.
+    """
+    if ts is None:
+        return "?"
+    return datetime.fromtimestamp(ts, tz).strftime(fmt)
+
+
+@dataclass(frozen=True, slots=True)
+class Media:
+    kind: MediaKind
+    file_id: str = ""
+    path: str = ""  # локальный файл, если file_id ещё нет
+    # file_unique_id из Telegram: одинаков у всех пересылок одного файла, в отличие от file_id
+    unique_id: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class Post:
+    """Пост в очереди
+
+    Посты неизменяемы: перенос, отметка о доставке и прочие правки делаются
+    через dataclasses.replace() и store.replace(). ts — время публикации в
+    секундах epoch или None, пока слот не назначен (массовый импорт).
+    repeat — cron-правило «вечнозелёного» поста: после публикации он не
+    удаляется, а переносится на следующую сработку правила.
+    """
+
+    ts: int = None
+    text: str = ""  # текст поста или подпись к медиа
+    media: tuple = ()
+    channels: tuple = ()  # свои каналы поста вместо каналов из настроек
+    delivered: tuple = ()  # каналы, куда пост уже ушёл при частичной ошибке
+    id: str = field(default_factory=new_id)
+    repeat: str = ""
+
+    @property
+    def type(self) -> str:
+        if not self.media:
+            return "text"
+        return "single" if len(self.media) == 1 else "album"
+
+
+# ========================================================================
+# КОДИРОВАНИЕ
+# ========================================================================
+def encode(post: Post) -> list:
+    """Компактная запись: [id, ts, text, media, channels, delivered, repeat] без пустого хвоста
+
+    Медиа — [код типа, file_id, path, unique_id], тоже без пустого хвоста.
+    """
+    media = [_trim([KIND_CODES[m.kind], m.file_id, m.path, m.unique_id], keep=2) for m in post.media]
+    record = [post.id, post.ts, post.text, media, list(post.channels), list(post.delivered), post.repeat]
+    return _trim(record, keep=1)
+
+
+def _trim(record: list, keep: int) -> list:
+    while len(record) > keep and not record[-1]:
+        record.pop()
+    return record
+
+
+def decode(record) -> Post:
+    """Пост из компактной записи или из словаря старого формата posts.json"""
+    if isinstance(record, dict):
+        return from_legacy(record)
+    # Загрузка очереди декодирует каждый пост, поэтому без распаковки в промежуточный список
+    n = len(record)
+    return Post(
+        record[1] if n > 1 else None,
+        record[2] if n > 2 else "",
+        tuple([Media(CODE_KINDS[m[0]], *m[1:]) for m in record[3]]) if n > 3 else (),
+        tuple(record[4]) if n > 4 else (),
+        tuple(record[5]) if n > 5 else (),
+        record[0],
+        record[6] if n > 6 else "",
+    )
+
+
+def from_legacy(data) -> Post:
+    """Пост из словаря старого формата: {"time": "HH:MM ДД.ММ.ГГГГ", "type": ..., ...}"""
+    media = tuple(
+        Media(MediaKind(m["kind"]), m.get("file_id") or "", m.get("path") or "", m.get("unique_id") or "")
+        for m in data.get("media") or ()
+    )
+    return Post(
+        ts=parse_time(data.get("time")),
+        text=data.get("caption") or data.get("text") or "",
+        media=media,
+        channels=tuple(data.get("channels") or ()),
+        delivered=tuple(data.get("delivered") or ()),
+        id=data.get("id") or new_id(),
+        repeat=data.get("repeat") or "",
+    )
+
+
+def to_dict(post: Post) -> dict:
+    """Читаемый словарь (для архива и выгрузок)"""
+    data = {"id": post.id, "time": format_time(post.ts), "type": post.type, "text": post.text}
+    if post.media:
+        data["media"] = [
+            {"kind": m.kind.value, **{name: getattr(m, name) for name in ("file_id", "path", "unique_id") if getattr(m, name)}}
+            for m in post.media
+        ]
+    if post.channels:
+        data["channels"] = list(post.channels)
+    if post.delivered:
+        data["delivered"] = list(post.delivered)
+    if post.repeat:
+        data["repeat"] = post.repeat
+    return data
@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+
+# Частота сэмплирования: 100 раз в секунду почти не заметна для бота
+DEFAULT_INTERVAL = 0.01
+# Сколько loop может не отзываться, прежде чем текущий колбэк считается медленным
+DEFAULT_THRESHOLD = 0.1
+MAX_DEPTH = 64
+TOP = 25
+# Кадры, в которых loop ждёт событий, а не работает
+IDLE_FUNCTIONS = {("selectors.py", "select"), ("selectors.py", "poll")}
+
+
+def _short_path(path: str) -> str:
+    """Путь файла покороче: от каталога бота или от site-packages"""
+    cwd = os.getcwd() + os.sep
+    if path.startswith(cwd):
+        return path[len(cwd):]
+    marker = "site-packages" + os.sep
+    if marker in path:
+        return path[path.rindex(marker) + len(marker):]
+    return os.path.basename(path)
+
+
+def _format_frame(frame) -> str:
+    path, name, line = frame
+    return f"{_short_path(path)}:{line} {name}"
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик потока event loop с монитором его задержек
+
+    Отдельный поток каждые interval секунд снимает стек потока loop через
+    sys._current_frames(): вызовы не трассируются, поэтому профиль можно
+    снимать с работающего бота. Корутина в самом loop отмечается с тем же
+    шагом; если отметки нет дольше threshold, loop занят одним колбэком, и
+    снятые в это время стеки попадают в отчёт как медленные колбэки.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, threshold: float = DEFAULT_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stacks = Counter()  # стек (кадры от внешнего к внутреннему) -> число сэмплов
+        self.slow = Counter()  # стеки, снятые, пока loop не отзывался
+        self.lags = []  # опоздания пробуждений loop, с
+        self.samples = 0
+        self.duration = 0.0
+        self._heartbeat = 0.0
+
+    async def run(self, duration: float):
+        """Профилировать duration секунд; вызывается из потока event loop"""
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._sample, args=(threading.get_ident(), stop), name="profiler", daemon=True
+        )
+        started = self._heartbeat = time.perf_counter()
+        thread.start()
+        try:
+            while self._heartbeat - started < duration:
+                before = time.perf_counter()
+                await asyncio.sleep(self.interval)
+                self._heartbeat = time.perf_counter()
+                self.lags.append(max(0.0, self._heartbeat - before - self.interval))
+        finally:
+            stop.set()
+            await asyncio.to_thread(thread.join)
+            self.duration = time.perf_counter() - started
+
+    def _sample(self, thread_id: int, stop: threading.Event):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, frame.f_lineno))
+                frame = frame.f_back
+            if not stack:
+                continue
+            stack = tuple(reversed(stack))
+            self.stacks[stack] += 1
+            self.samples += 1
+            if time.perf_counter() - self._heartbeat > self.threshold:
+                self.slow[stack] += 1
+
+    # --------------------------------------------------------------------
+    # Отчёт
+    # --------------------------------------------------------------------
+    @staticmethod
+    def _idle(stack) -> bool:
+        path, name, _ = stack[-1]
+        return (os.path.basename(path), name) in IDLE_FUNCTIONS
+
+    def summary(self) -> str:
+        """Две строки для подписи к отчёту"""
+        idle = sum(count for stack, count in self.stacks.items() if self._idle(stack))
+        stalls = sum(lag > self.threshold for lag in self.lags)
+        busy = 100 * (1 - idle / self.samples) if self.samples else 0.0
+        return (
+            f"{self.duration:.0f} с, {self.samples} сэмплов, loop занят {busy:.1f}% времени\n"
+            f"Задержка loop: p95 {_percentile(self.lags, 0.95) * 1e3:.1f} мс, "
+            f"максимум {max(self.lags, default=0) * 1e3:.0f} мс, "
+            f"зависаний дольше {self.threshold * 1e3:.0f} мс: {stalls}"
+        )
+
+    def report(self) -> str:
+        """Текстовый отчёт: горячие строки, функции с вложенными вызовами и медленные колбэки"""
+        busy = Counter({stack: count for stack, count in self.stacks.items() if not self._idle(stack)})
+        total = sum(busy.values()) or 1
+        own, inclusive = Counter(), Counter()
+        for stack, count in busy.items():
+            own[stack[-1]] += count
+            # Рекурсивная функция считается в стеке один раз
+            for path, name in {(path, name) for path, name, _ in stack}:
+                inclusive[(path, name)] += count
+
+        lines = [
+            f"Профиль event loop (сэмпл каждые {self.interval * 1e3:g} мс, без учёта ожидания событий)",
+            self.summary(),
+            "",
+            "== Собственное время: строки, на которых loop был занят ==",
+        ]
+        for frame, count in own.most_common(TOP):
+            lines.append(f"{100 * count / total:6.1f}% {count:6} {_format_frame(frame)}")
+        lines += ["", "== С вложенными вызовами: функции =="]
+        for (path, name), count in inclusive.most_common(TOP):
+            lines.append(f"{100 * count / total:6.1f}% {count:6} {_short_path(path)} {name}")
+        lines += ["", f"== Медленные колбэки: стеки, пока loop не отзывался дольше {self.threshold * 1e3:.0f} мс =="]
+        if not self.slow:
+            lines.append("нет")
+        for stack, count in self.slow.most_common(10):
+            lines.append(f"{count} сэмплов, ~{count * self.interval * 1e3:.0f} мс:")
+            lines.extend(f"    {_format_frame(frame)}" for frame in stack[-15:])
+        return "\n".join(lines) + "\n"
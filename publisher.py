@@ -0,0 +1,22 @@
+import asyncio
+
+
+async def fan_out(send, post, channels, concurrency: int = 10):
+    """Отправить пост во все каналы параллельно
+
+    send(channel, post) — корутина отправки в один канал. Одновременно идёт
+    не больше concurrency отправок; ошибка или задержка одного канала не
+    мешает остальным. Возвращает {канал: None при успехе или исключение}.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def send_one(channel):
+        async with semaphore:
+            try:
+                await send(channel, post)
+                return channel, None
+            except Exception as e:
+                return channel, e
+
+    results = await asyncio.gather(*(send_one(channel) for channel in channels))
+    return dict(results)
@@ -0,0 +1,260 @@
+import bisect
+from functools import lru_cache
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+WEEKDAY_NAMES = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
+MONTH_NAMES = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+WEEK = 7 * 86400
+# Дальше этого горизонта свободный слот не ищем: расписание, видимо, пустое
+MAX_WEEKS = 52 * 10
+
+
+def get_zone(name: str):
+    """Часовой пояс по имени IANA; пустая строка — локальное время сервера"""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"неизвестный часовой пояс {name!r}")
+
+
+def _parse_field(text: str, lo: int, hi: int, names=None) -> frozenset:
+    """Поле cron: *, списки через запятую, диапазоны a-b и шаг /n"""
+    values = set()
+    for part in text.lower().split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/", 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError(f"шаг должен быть больше 0: {text!r}")
+
+        def value(token):
+            return names[token] if names and token in names else int(token)
+
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            a, b = part.split("-", 1)
+            start, end = value(a), value(b)
+        else:
+            start = value(part)
+            # 5/15 в cron — «с 5-й каждые 15»
+            end = hi if step > 1 else start
+        if not lo <= start <= end <= hi:
+            raise ValueError(f"значение вне диапазона {lo}-{hi}: {text!r}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronRule:
+    """Правило в формате cron: "минуты часы дни_месяца месяцы дни_недели"
+
+    Например "0 9,18 * * mon-fri" или "*/30 10-20 * * sat,sun". Дни недели —
+    0-7 (0 и 7 — воскресенье) или mon..sun. Ограничения дня месяца и месяца
+    работают как фильтр вместе с днями недели (в отличие от «или» классического
+    cron): "0 12 1-7 * mon" — первый понедельник месяца.
+    """
+
+    __slots__ = ("expr", "minutes", "hours", "days", "months", "weekdays")
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"в правиле {expr!r} должно быть 5 полей: минуты часы дни месяцы дни_недели")
+        self.expr = expr
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = None if fields[2] == "*" else _parse_field(fields[2], 1, 31)
+        self.months = None if fields[3] == "*" else _parse_field(fields[3], 1, 12, MONTH_NAMES)
+        # В cron воскресенье — 0 (и 7), в Python понедельник — 0
+        self.weekdays = frozenset((d - 1) % 7 for d in _parse_field(fields[4], 0, 7, WEEKDAY_NAMES))
+
+    def offsets(self):
+        """Секунды от начала недели (понедельник 00:00) для всех сработок правила"""
+        return [
+            weekday * 86400 + hour * 3600 + minute * 60
+            for weekday in self.weekdays for hour in self.hours for minute in self.minutes
+        ]
+
+    @property
+    def filters_days(self) -> bool:
+        return self.days is not None or self.months is not None
+
+    def day_ok(self, day: date) -> bool:
+        return (self.days is None or day.day in self.days) and (self.months is None or day.month in self.months)
+
+
+class Blackout:
+    """Даты без публикаций: "31.12" каждый год, "01.01.2030" разово, диапазоны через дефис"""
+
+    def __init__(self, entries=()):
+        self.entries = tuple(entries)
+        self._dates = set()
+        self._yearly = set()  # (месяц, день)
+        for entry in self.entries:
+            start, _, end = entry.strip().partition("-")
+            start, end = self._parse(start), self._parse(end or start)
+            if isinstance(start, date) != isinstance(end, date):
+                raise ValueError(f"неверный диапазон дат {entry!r}")
+            if isinstance(start, date):
+                if end < start:
+                    raise ValueError(f"неверный диапазон дат {entry!r}")
+                self._dates.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+            else:
+                # Ежегодный диапазон может переходить через Новый год (25.12-08.01);
+                # начинаем с високосного года, чтобы попало 29.02
+                day = date(2000, *start)
+                for _ in range(366):
+                    self._yearly.add((day.month, day.day))
+                    if (day.month, day.day) == end:
+                        break
+                    day += timedelta(days=1)
+
+    @staticmethod
+    def _parse(text: str):
+        text = text.strip()
+        try:
+            return datetime.strptime(text, "%d.%m.%Y").date()
+        except ValueError:
+            pass
+        try:
+            parsed = datetime.strptime(f"{text}.2000", "%d.%m.%Y")
+        except ValueError:
+            raise ValueError(f"дата {text!r} не в формате ДД.ММ или ДД.ММ.ГГГГ")
+        return (parsed.month, parsed.day)
+
+    def __contains__(self, day: date) -> bool:
+        return day in self._dates or (day.month, day.day) in self._yearly
+
+    def __bool__(self):
+        return bool(self._dates or self._yearly)
+
+
+class Schedule:
+    """Расписание слотов: объединение cron-правил, даты без публикаций и часовой пояс
+
+    Правила разворачиваются один раз в отсортированную недельную сетку
+    (секунды от начала недели). Слоты нумеруются подряд: неделя * размер
+    сетки + позиция в ней, поэтому переход от времени к номеру и обратно —
+    арифметика и один бинарный поиск. Дни месяца, месяцы и даты без
+    публикаций проверяются только у конкретного слота, а следующие сработки
+    выдаются лениво через slots() без перебора дней наперёд.
+    """
+
+    def __init__(self, rules, blackout: Blackout = None, tz=None):
+        self.rules = tuple(rules)
+        self.blackout = blackout or Blackout()
+        self.tz = tz
+        owners = {}
+        for rule in self.rules:
+            for offset in rule.offsets():
+                owners.setdefault(offset, []).append(rule)
+        self.week = tuple(sorted(owners))
+        self._pos = {offset: i for i, offset in enumerate(self.week)}
+        # (день недели, время) для каждой позиции сетки
+        self._parts = [
+            (offset // 86400, time(offset % 86400 // 3600, offset % 3600 // 60)) for offset in self.week
+        ]
+        # Позиции, у которых день нужно проверять по фильтрам правил
+        self._day_filters = {
+            self._pos[offset]: tuple(rules) for offset, rules in owners.items()
+            if all(rule.filters_days for rule in rules)
+        }
+        # False — разрешён любой слот сетки, фильтры можно не проверять
+        self.filtered = bool(self._day_filters) or bool(self.blackout)
+
+    @classmethod
+    def daily(cls, times, blackout: Blackout = None, tz=None):
+        """Одинаковое расписание на каждый день из списка "HH:MM" """
+        rules = []
+        for t in times:
+            parsed = datetime.strptime(t.strip(), "%H:%M")
+            rules.append(CronRule(f"{parsed.minute} {parsed.hour} * * *"))
+        return cls(rules, blackout, tz)
+
+    def __len__(self):
+        return len(self.week)
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def localize(self, ts: float) -> datetime:
+        """Время epoch в часовом поясе расписания"""
+        return datetime.fromtimestamp(ts, self.tz)
+
+    # --------------------------------------------------------------------
+    # Нумерация слотов
+    # --------------------------------------------------------------------
+    @staticmethod
+    def _week_offset(dt: datetime):
+        # date(1, 1, 1) — понедельник, поэтому недели считаются от него
+        week, weekday = divmod(dt.toordinal() - 1, 7)
+        return week, weekday * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
+
+    def slot_number(self, dt: datetime):
+        """Номер слота для времени или None, если время не попадает в сетку"""
+        week, offset = self._week_offset(dt)
+        pos = self._pos.get(offset)
+        if pos is None:
+            return None
+        return week * len(self.week) + pos
+
+    def slot_datetime(self, n: int) -> datetime:
+        week, pos = divmod(n, len(self.week))
+        days, at = self._parts[pos]
+        return datetime.combine(date.fromordinal(week * 7 + 1 + days), at, tzinfo=self.tz)
+
+    def first_slot(self, now: datetime) -> int:
+        """Номер первого слота, который ещё не прошёл (без учёта фильтров дней)"""
+        week, offset = self._week_offset(now)
+        return week * len(self.week) + bisect.bisect_left(self.week, offset)
+
+    def allowed(self, n: int) -> bool:
+        """Разрешён ли слот фильтрами дней и датами без публикаций"""
+        if not self.filtered:
+            return True
+        rules = self._day_filters.get(n % len(self.week))
+        if rules is None and not self.blackout:
+            return True
+        day = self.slot_datetime(n).date()
+        if day in self.blackout:
+            return False
+        return rules is None or any(rule.day_ok(day) for rule in rules)
+
+    # --------------------------------------------------------------------
+    # Ленивые сработки
+    # --------------------------------------------------------------------
+    def slots(self, after: datetime = None):
+        """Генератор разрешённых времён начиная с after (по умолчанию — сейчас)"""
+        if not self.week:
+            return
+        n = self.first_slot(after or self.now())
+        limit = n + MAX_WEEKS * len(self.week)
+        while n < limit:
+            if self.allowed(n):
+                yield self.slot_datetime(n)
+                limit = n + MAX_WEEKS * len(self.week)
+            n += 1
+
+    def next_after(self, ts: float):
+        """Первое время строго после ts в секундах epoch, или None, если сработок нет"""
+        for dt in self.slots(self.localize(ts + 1)):
+            return int(dt.timestamp())
+        return None
+
+
+@lru_cache(maxsize=256)
+def compile_rule(expr: str) -> Schedule:
+    """Расписание повторяющегося поста: cron-правило и, через пробел, часовой пояс
+
+    "0 10 * * mon" или "0 10 * * mon Asia/Tokyo". Разбирается один раз на строку.
+    """
+    fields = expr.split()
+    tz = get_zone(fields[5]) if len(fields) == 6 else None
+    return Schedule([CronRule(" ".join(fields[:5]))], tz=tz)
@@ -0,0 +1,294 @@
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import aiohttp
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter, TelegramNetworkError, TelegramServerError
+
+# Приоритет запросов, отправленных из текущего контекста (меньше — важнее)
+PRIORITY_CHANNEL = 0
+PRIORITY_UI = 1
+_priority = ContextVar("send_priority", default=PRIORITY_UI)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Отправлять запросы внутри блока с указанным приоритетом"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько ждать до появления хотя бы одного токена"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float, amount: float = 1):
+        # Может уйти в минус: альбом из 10 медиа Telegram считает за 10 сообщений
+        self._refill(now)
+        self.tokens -= amount
+
+
+def idempotent(method) -> bool:
+    """Повтор запроса не создаст второе сообщение (в отличие от send*, copy*, forward*)"""
+    return not method.__api_method__.startswith(("send", "copy", "forward"))
+
+
+# Соединение с Telegram так и не установлено — запрос точно не ушёл
+# (ConnectionTimeoutError появился в aiohttp 3.10)
+NOT_SENT_ERRORS = (aiohttp.ClientConnectorError,) + (
+    (aiohttp.ConnectionTimeoutError,) if hasattr(aiohttp, "ConnectionTimeoutError") else ()
+)
+
+
+def request_not_sent(error: Exception) -> bool:
+    """Ошибка случилась до отправки запроса, и Telegram его не получил
+
+    Сессия aiogram заворачивает ошибку aiohttp в TelegramNetworkError через
+    raise ... from, поэтому исходная ошибка лежит в __cause__.
+    """
+    return isinstance(error, TelegramNetworkError) and isinstance(error.__cause__, NOT_SENT_ERRORS)
+
+
+class SendQueue(BaseRequestMiddleware):
+    """Единая очередь исходящих запросов к Bot API
+
+    Подключается как middleware сессии бота, поэтому через неё проходит любая
+    отправка — и bot.send_*, и message.answer. Запросы с chat_id выпускаются
+    по корзинам токенов (общей и на каждый чат), посты в каналы идут раньше
+    ответов в интерфейсе админа. RetryAfter блокирует чат на указанное время,
+    сетевые ошибки и 5xx повторяются с ограниченной экспоненциальной паузой —
+    кроме отправки сообщений: после такой ошибки неизвестно, дошло ли
+    сообщение, и повтор мог бы его задублировать. Если же соединение так и
+    не установилось, запрос точно не ушёл, и его повторяют как любой другой.
+    Лимиты Telegram действуют на каждого бота отдельно, поэтому у ботов с
+    общей сессией свои корзины: общая и на каждый чат.
+
+    У каждого чата своя очередь запросов. Чат с запросами лежит в одной из
+    куч: ждущих (по времени, когда чат сможет отправить) или готовых (по
+    приоритету и порядку первого запроса), поэтому выпуск запроса стоит
+    O(log n), а не сортировку всей очереди.
+    """
+
+    def __init__(self, global_rate: float = 30, private_rate: float = 1, group_rate: float = 20 / 60,
+                 max_attempts: int = 5, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.global_rate = global_rate
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._global_buckets = {}  # id бота -> TokenBucket
+        self._buckets = {}  # (id бота, chat_id) -> TokenBucket
+        self._blocked_until = {}  # (id бота, chat_id) -> monotonic, после RetryAfter
+        self._lanes = {}  # (id бота, chat_id) -> куча (приоритет, порядковый номер, запрос)
+        self._versions = {}  # (id бота, chat_id) -> номер актуальной записи чата в кучах ниже
+        self._waiting = []  # куча (когда чат сможет отправить, номер записи, ключ чата)
+        self._ready = {}  # id бота -> куча (приоритет, порядковый номер первого запроса, номер записи, ключ чата)
+        self._size = 0
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker = None
+        self._inflight = set()
+
+    def __len__(self):
+        return self._size
+
+    # --------------------------------------------------------------------
+    # Middleware
+    # --------------------------------------------------------------------
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        # getUpdates, answerCallbackQuery и прочее без чата не ограничиваем
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        request = {
+            "chat_id": chat_id,
+            "key": (bot.id, chat_id),
+            "make_request": make_request,
+            "bot": bot,
+            "method": method,
+            "future": future,
+            "attempt": 0,
+            "not_before": 0.0,
+            "cost": len(getattr(method, "media", None) or ()) or 1,
+        }
+        self._push(_priority.get(), request)
+        return await future
+
+    def _push(self, priority: int, request):
+        key = request["key"]
+        heapq.heappush(self._lanes.setdefault(key, []), (priority, next(self._seq), request))
+        self._size += 1
+        self._place(key, time.monotonic())
+        self._wakeup.set()
+
+    # --------------------------------------------------------------------
+    # Выпуск запросов
+    # --------------------------------------------------------------------
+    def _global_bucket(self, bot_id: int):
+        bucket = self._global_buckets.get(bot_id)
+        if bucket is None:
+            bucket = self._global_buckets[bot_id] = TokenBucket(self.global_rate, self.global_rate)
+        return bucket
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # Личные чаты — положительные id; группы и каналы — отрицательные или @username
+            chat_id = key[1]
+            private = isinstance(chat_id, int) and chat_id > 0
+            rate = self.private_rate if private else self.group_rate
+            capacity = 3 if private else 20
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+        return bucket
+
+    def _chat_wait(self, request, now: float) -> float:
+        key = request["key"]
+        return max(
+            request["not_before"] - now,
+            self._blocked_until.get(key, 0.0) - now,
+            self._bucket(key).wait_time(now),
+        )
+
+    def _place(self, key, now: float):
+        """Положить чат в кучу ждущих или готовых по его первому запросу
+
+        Прежняя запись чата, если была, становится устаревшей и отбрасывается,
+        когда дойдёт до верха своей кучи.
+        """
+        lane = self._lanes.get(key)
+        if not lane:
+            self._lanes.pop(key, None)
+            self._versions.pop(key, None)
+            return
+        version = self._versions[key] = next(self._seq)
+        priority, seq, request = lane[0]
+        wait = self._chat_wait(request, now)
+        if wait > 0:
+            heapq.heappush(self._waiting, (now + wait, version, key))
+        else:
+            heapq.heappush(self._ready.setdefault(key[0], []), (priority, seq, version, key))
+
+    def _next_ready(self, now: float):
+        """Бот с самым приоритетным готовым чатом и, если такого нет, сколько ждать"""
+        # Чаты, дождавшиеся своей очереди, переходят в готовые
+        while self._waiting and self._waiting[0][0] <= now:
+            _, version, key = heapq.heappop(self._waiting)
+            if self._versions.get(key) == version:
+                self._place(key, now)
+
+        best, best_bot, wait = None, None, None
+        for bot_id, ready in list(self._ready.items()):
+            while ready and self._versions.get(ready[0][3]) != ready[0][2]:
+                heapq.heappop(ready)
+            if not ready:
+                del self._ready[bot_id]
+                continue
+            # Общий лимит бота держит сразу все его чаты
+            global_wait = self._global_bucket(bot_id).wait_time(now)
+            if global_wait > 0:
+                wait = global_wait if wait is None else min(wait, global_wait)
+            elif best is None or ready[0][:2] < best[:2]:
+                best, best_bot = ready[0], bot_id
+        if best is not None:
+            return best_bot, 0.0
+        if self._waiting:
+            wait = self._waiting[0][0] - now if wait is None else min(wait, self._waiting[0][0] - now)
+        return None, wait
+
+    async def _sleep(self, timeout):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            bot_id, wait = self._next_ready(now)
+            if bot_id is None:
+                await self._sleep(wait)
+                continue
+
+            key = heapq.heappop(self._ready[bot_id])[3]
+            priority, _, request = heapq.heappop(self._lanes[key])
+            self._size -= 1
+            self._global_bucket(bot_id).consume(now, request["cost"])
+            self._bucket(key).consume(now, request["cost"])
+            # Следующий запрос чата встаёт в очередь уже с учётом потраченного токена
+            self._place(key, now)
+
+            task = asyncio.ensure_future(self._execute(priority, request))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, priority: int, request):
+        future = request["future"]
+        if future.done():
+            return
+        request["attempt"] += 1
+        try:
+            result = await request["make_request"](request["bot"], request["method"])
+        except TelegramRetryAfter as e:
+            # Telegram сам сказал, сколько ждать: блокируем весь чат, а не только запрос
+            self._blocked_until[request["key"]] = time.monotonic() + e.retry_after
+            self._place(request["key"], time.monotonic())
+            logging.warning(f"Flood control в чате {request['chat_id']}, пауза {e.retry_after} с")
+            self._retry_or_fail(priority, request, e, delay=0.0)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            if not idempotent(request["method"]) and not request_not_sent(e):
+                # Запрос мог дойти до Telegram: решение о повторе — за вызывающим кодом
+                if not future.done():
+                    future.set_exception(e)
+                return
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (request["attempt"] - 1))
+            self._retry_or_fail(priority, request, e, delay=delay * random.uniform(0.5, 1.0))
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    def _retry_or_fail(self, priority: int, request, error, delay: float):
+        if request["attempt"] >= self.max_attempts:
+            if not request["future"].done():
+                request["future"].set_exception(error)
+            return
+        request["not_before"] = time.monotonic() + delay
+        self._push(priority, request)
+
+    async def close(self):
+        """Остановить выпуск запросов"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
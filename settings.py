@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import logging
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+
+from storage import atomic_write
+from schedule import Schedule, CronRule, Blackout, get_zone
+
+CATCH_UP_POLICIES = ("publish", "reslot", "drop")
+DUPLICATE_POLICIES = ("warn", "reject", "allow")
+
+
+@dataclass(frozen=True)
+class Config:
+    """Настройки бота из config.json
+
+    Времена публикаций и расписание проверяются и разбираются один раз при
+    создании. Объект неизменяемый: для правок используйте dataclasses.replace().
+    """
+    channel_id: str = ""
+    publish_times: tuple = ("09:00", "13:00", "17:00", "21:00")
+    standard_text: str = "<b>Стандартный</b> текст"
+    # Дополнительные каналы для кросс-постинга; channel_id всегда первый
+    channels: tuple = ()
+    # Сколько каналов публикуются одновременно
+    fanout_concurrency: int = 10
+    # Что делать с постами, пропустившими своё время:
+    # publish — опубликовать с ограничением скорости, reslot — перенести
+    # на ближайшие свободные слоты, drop — убрать в архив
+    catch_up_policy: str = "publish"
+    # Скорость догоняющей публикации, постов в минуту
+    catch_up_rate: float = 2.0
+    # Что делать с медиа, которое уже стоит в очереди или недавно вышло:
+    # warn — запланировать и предупредить, reject — не планировать, allow — не проверять
+    duplicate_policy: str = "warn"
+    # Сколько последних опубликованных медиа помнить для проверки повторов
+    duplicate_history: int = 1000
+    # Слоты в формате cron ("0 9,18 * * mon-fri"); если заданы, заменяют publish_times
+    schedule: tuple = ()
+    # Даты без публикаций: "31.12" каждый год, "01.01.2030" разово, "25.12-08.01"
+    blackout: tuple = ()
+    # Часовой пояс слотов (IANA, например "Europe/Moscow"); пусто — время сервера
+    timezone: str = ""
+    # Отсортированные datetime.time, вычисляются из publish_times
+    times: tuple = field(init=False, repr=False, compare=False)
+    # Скомпилированное расписание слотов (schedule.Schedule)
+    slot_schedule: Schedule = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not isinstance(self.channel_id, str):
+            object.__setattr__(self, "channel_id", str(self.channel_id))
+        channels = tuple(str(c).strip() for c in self.channels if str(c).strip())
+        object.__setattr__(self, "channels", channels)
+        if not isinstance(self.fanout_concurrency, int) or self.fanout_concurrency < 1:
+            raise ValueError("fanout_concurrency должен быть целым числом больше 0")
+        if self.catch_up_policy not in CATCH_UP_POLICIES:
+            raise ValueError(f"catch_up_policy должен быть одним из: {', '.join(CATCH_UP_POLICIES)}")
+        if not isinstance(self.catch_up_rate, (int, float)) or self.catch_up_rate <= 0:
+            raise ValueError("catch_up_rate должен быть положительным числом")
+        if self.duplicate_policy not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicate_policy должен быть одним из: {', '.join(DUPLICATE_POLICIES)}")
+        if not isinstance(self.duplicate_history, int) or self.duplicate_history < 0:
+            raise ValueError("duplicate_history должен быть целым неотрицательным числом")
+        if not isinstance(self.standard_text, str):
+            raise ValueError("standard_text должен быть строкой")
+        if isinstance(self.publish_times, str) or not self.publish_times:
+            raise ValueError("publish_times должен быть непустым списком")
+        # Бросает ValueError на неверном формате
+        parsed = {datetime.strptime(t.strip(), "%H:%M").time(): t.strip() for t in self.publish_times}
+        times = tuple(sorted(parsed))
+        object.__setattr__(self, "times", times)
+        object.__setattr__(self, "publish_times", tuple(parsed[t] for t in times))
+        if isinstance(self.schedule, str) or isinstance(self.blackout, str):
+            raise ValueError("schedule и blackout должны быть списками")
+        if not isinstance(self.timezone, str):
+            raise ValueError("timezone должен быть строкой")
+        object.__setattr__(self, "schedule", tuple(r.strip() for r in self.schedule if r.strip()))
+        object.__setattr__(self, "blackout", tuple(d.strip() for d in self.blackout if d.strip()))
+        # Бросают ValueError на неверном правиле, дате или часовом поясе
+        blackout, tz = Blackout(self.blackout), get_zone(self.timezone)
+        if self.schedule:
+            slot_schedule = Schedule([CronRule(rule) for rule in self.schedule], blackout, tz)
+        else:
+            slot_schedule = Schedule.daily(self.publish_times, blackout, tz)
+        # Иначе next_free_many бросит ошибку в каждом обработчике, который ставит посты
+        if slot_schedule.next_after(time.time()) is None:
+            raise ValueError("расписание никогда не срабатывает: проверьте schedule, publish_times и blackout")
+        object.__setattr__(self, "slot_schedule", slot_schedule)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            channel_id=data.get("channel_id", ""),
+            publish_times=tuple(data.get("publish_times", cls.publish_times)),
+            standard_text=data.get("standard_text", cls.standard_text),
+            channels=tuple(data.get("channels", ())),
+            fanout_concurrency=data.get("fanout_concurrency", cls.fanout_concurrency),
+            catch_up_policy=data.get("catch_up_policy", cls.catch_up_policy),
+            catch_up_rate=data.get("catch_up_rate", cls.catch_up_rate),
+            duplicate_policy=data.get("duplicate_policy", cls.duplicate_policy),
+            duplicate_history=data.get("duplicate_history", cls.duplicate_history),
+            schedule=tuple(data.get("schedule", ())),
+            blackout=tuple(data.get("blackout", ())),
+            timezone=data.get("timezone", cls.timezone),
+        )
+
+    @property
+    def targets(self) -> tuple:
+        """Все каналы публикации без повторов, начиная с channel_id"""
+        targets = (self.channel_id,) + self.channels if self.channel_id else self.channels
+        return tuple(dict.fromkeys(targets))
+
+    def to_dict(self):
+        data = asdict(self)
+        data.pop("times")
+        data.pop("slot_schedule")
+        data["publish_times"] = list(self.publish_times)
+        data["channels"] = list(self.channels)
+        data["schedule"] = list(self.schedule)
+        data["blackout"] = list(self.blackout)
+        return data
+
+
+class ConfigStore:
+    """Кэш config.json с перечитыванием при изменении файла
+
+    Файл читается один раз; дальше get() раз в check_interval секунд
+    сверяет mtime и перечитывает файл, только если его правили снаружи.
+    Подписчики получают (старый, новый) конфиг при каждом изменении.
+    """
+
+    def __init__(self, path: str, default: Config = None, check_interval: float = 1.0):
+        self.path = path
+        self.default = default or Config()
+        self.check_interval = check_interval
+        self._config = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """callback(old, new) вызывается при каждом изменении настроек"""
+        self._subscribers.append(callback)
+
+    def get(self) -> Config:
+        now = time.monotonic()
+        if self._config is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reload_if_changed()
+        return self._config
+
+    def save(self, config: Config):
+        atomic_write(self.path, json.dumps(config.to_dict(), ensure_ascii=False, indent=2))
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self._set(config)
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            if self._config is None:
+                self.save(self.default)
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                config = Config.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logging.error(f"Ошибка в {self.path}, оставляю прежние настройки: {e}")
+            if self._config is None:
+                self._set(self.default)
+            return
+        self._set(config)
+
+    def _set(self, config: Config):
+        old, self._config = self._config, config
+        if old == config:
+            return
+        for callback in self._subscribers:
+            try:
+                callback(old, config)
+            except Exception as e:
+                logging.error(f"Ошибка подписчика настроек: {e}")
+
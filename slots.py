@@ -0,0 +1,145 @@
+import bisect
+from datetime import datetime
+
+from schedule import Schedule, MAX_WEEKS
+
+
+class SlotIndex:
+    """Индекс занятых слотов публикации
+
+    Слоты — это сетка расписания (schedule.Schedule): каждый слот получает
+    порядковый номер, и номера идут подряд по времени. Занятые номера
+    хранятся в отсортированном списке, поэтому поиск следующего свободного
+    слота — бинарный поиск первой «дырки» без ограничения горизонта. Слоты,
+    которые отсекают фильтры дней или даты без публикаций, пропускаются.
+    """
+
+    def __init__(self, times=()):
+        self._occupied = []  # отсортированные уникальные номера занятых слотов
+        self._counts = {}  # номер слота -> сколько постов на нём стоит
+        self._timestamps = {}  # время поста -> сколько постов, для перестройки сетки
+        self.set_times(times)
+
+    # --------------------------------------------------------------------
+    # Сетка слотов
+    # --------------------------------------------------------------------
+    def set_times(self, times):
+        """Ежедневное расписание из списка "HH:MM" """
+        self.set_schedule(Schedule.daily(times))
+
+    def set_schedule(self, schedule: Schedule):
+        """Сменить расписание и перестроить индекс"""
+        self.schedule = schedule
+        timestamps, self._timestamps = self._timestamps, {}
+        self._occupied.clear()
+        self._counts.clear()
+        for ts, count in timestamps.items():
+            for _ in range(count):
+                self.add(ts)
+
+    def slot_number(self, dt: datetime):
+        """Номер слота для времени или None, если время не попадает в сетку"""
+        return self.schedule.slot_number(dt)
+
+    def slot_datetime(self, n: int) -> datetime:
+        return self.schedule.slot_datetime(n)
+
+    # --------------------------------------------------------------------
+    # Учёт занятых слотов
+    # --------------------------------------------------------------------
+    def add(self, ts: float):
+        """Отметить время поста как занятое"""
+        self._timestamps[ts] = self._timestamps.get(ts, 0) + 1
+        n = self.slot_for_ts(ts)
+        if n is None:
+            return
+        if n in self._counts:
+            self._counts[n] += 1
+        else:
+            self._counts[n] = 1
+            bisect.insort(self._occupied, n)
+
+    def clear(self):
+        """Забыть все занятые слоты (перед перестройкой из хранилища)"""
+        self._occupied.clear()
+        self._counts.clear()
+        self._timestamps.clear()
+
+    def remove(self, ts: float):
+        """Освободить время поста (после публикации или удаления)"""
+        if ts not in self._timestamps:
+            return
+        self._timestamps[ts] -= 1
+        if not self._timestamps[ts]:
+            del self._timestamps[ts]
+        n = self.slot_for_ts(ts)
+        if n is None or n not in self._counts:
+            return
+        self._counts[n] -= 1
+        if not self._counts[n]:
+            del self._counts[n]
+            del self._occupied[bisect.bisect_left(self._occupied, n)]
+
+    def slot_for_ts(self, ts: float):
+        """Номер слота для времени поста или None, если оно вне сетки"""
+        if not len(self.schedule) or ts == float("inf"):
+            return None
+        return self.slot_number(self.schedule.localize(ts))
+
+    def run_after_gap(self, ts: float):
+        """Слоты, занятые подряд сразу за свободным слотом времени ts: (первый, за последним)
+
+        Посты на этих слотах можно сдвинуть на слот раньше, закрыв дырку.
+        None, если ts вне сетки, слот занят или следующий слот свободен. O(log k).
+        """
+        n = self.slot_for_ts(ts)
+        if n is None or n in self._counts:
+            return None
+        end = self._free_from(n + 1)
+        if end == n + 1:
+            return None
+        return n + 1, end
+
+    # --------------------------------------------------------------------
+    # Поиск свободных слотов
+    # --------------------------------------------------------------------
+    def _free_from(self, n: int) -> int:
+        """Первый свободный номер слота, не меньший n — O(log k)"""
+        occ = self._occupied
+        i = bisect.bisect_left(occ, n)
+        if i == len(occ) or occ[i] != n:
+            return n
+        # occ[i..j) идут подряд, пока occ[j] - j не изменится; ищем границу бинпоиском
+        key = occ[i] - i
+        lo, hi = i, len(occ)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if occ[mid] - mid > key:
+                hi = mid
+            else:
+                lo = mid + 1
+        return occ[i] + (lo - i)
+
+    def next_free(self, now: datetime = None) -> datetime:
+        """Ближайший свободный слот"""
+        return self.next_free_many(1, now)[0]
+
+    def next_free_many(self, k: int, now: datetime = None):
+        """k ближайших свободных слотов по возрастанию"""
+        schedule = self.schedule
+        if not len(schedule):
+            raise ValueError("Не задано ни одного времени публикации")
+        n = schedule.first_slot(now or schedule.now())
+        result = []
+        for _ in range(k):
+            n = self._free_from(n)
+            # Без фильтров дней и дат без публикаций разрешён любой слот сетки
+            if schedule.filtered:
+                limit = n + MAX_WEEKS * len(schedule)
+                while not schedule.allowed(n):
+                    n = self._free_from(n + 1)
+                    if n > limit:
+                        raise ValueError("В расписании нет ни одного разрешённого слота")
+            result.append(self.slot_datetime(n))
+            n += 1
+        return result
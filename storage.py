@@ -0,0 +1,468 @@
+import os
+import sys
+import json
+import bisect
+import sqlite3
+import asyncio
+import logging
+from datetime import datetime
+
+from posts import TIME_FORMAT, encode, decode, to_dict
+from metrics import STORAGE_SECONDS
+
+# Версия формата posts.json: 1 — список словарей, 2 — компактные записи
+FILE_VERSION = 2
+
+
+def post_timestamp(post) -> float:
+    """Время публикации поста в секундах epoch (или inf, если слот не назначен)"""
+    return float("inf") if post.ts is None else post.ts
+
+
+def atomic_write(path: str, data: str):
+    """Записать файл атомарно: временный файл + fsync + rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # Фиксируем сам rename, иначе после сбоя питания может остаться старый файл
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def append_archive(path: str, posts, reason: str):
+    """Дописать посты в архив (JSON Lines) с причиной и временем архивации"""
+    archived_at = datetime.now().strftime(TIME_FORMAT)
+    with open(path, "a", encoding="utf-8") as f:
+        for post in posts:
+            record = {"archived_at": archived_at, "reason": reason, "post": to_dict(post)}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ========================================================================
+# ИНТЕРФЕЙС
+# ========================================================================
+class PostStore:
+    """Интерфейс хранилища очереди постов
+
+    Посты — неизменяемые posts.Post с постоянным id. Порядок везде — по
+    времени публикации. Изменённый пост заменяется целиком через replace().
+    """
+
+    def load(self):
+        """Подготовить хранилище к работе (один раз при старте)"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Сохранить всё несохранённое и освободить ресурсы"""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def get(self, post_id):
+        raise NotImplementedError
+
+    def by_index(self, idx: int):
+        """Пост по порядковому номеру в очереди"""
+        raise NotImplementedError
+
+    def page(self, offset: int, limit: int):
+        """Посты с порядковыми номерами [offset, offset + limit)"""
+        posts = (self.by_index(i) for i in range(offset, offset + limit))
+        return [post for post in posts if post is not None]
+
+    def position(self, ts: float) -> int:
+        """Сколько постов в очереди стоит раньше момента ts"""
+        raise NotImplementedError
+
+    def add(self, post) -> str:
+        """Добавить пост, вернуть его id"""
+        raise NotImplementedError
+
+    def add_many(self, posts):
+        """Добавить пачку постов одной записью"""
+        for post in posts:
+            self.add(post)
+
+    def replace(self, post):
+        """Заменить пост целиком (по его id)"""
+        raise NotImplementedError
+
+    def replace_many(self, posts):
+        """Заменить пачку постов одной записью: на диске либо все изменения, либо ни одного"""
+        for post in posts:
+            self.replace(post)
+
+    def remove(self, post_id):
+        """Удалить пост, вернуть удалённый пост или None"""
+        raise NotImplementedError
+
+    def changed_externally(self) -> bool:
+        """Меняли ли очередь другие процессы с прошлой проверки"""
+        return False
+
+
+# ========================================================================
+# JSON-ФАЙЛ
+# ========================================================================
+class JsonPostStore(PostStore):
+    """Очередь постов в памяти с отложенной пакетной записью в JSON-файл
+
+    Все изменения применяются к памяти сразу, а в файл попадают одним снимком
+    не чаще раза в flush_delay секунд. Для запросов по времени рядом с постами
+    хранится отсортированный индекс (время, id).
+    """
+
+    def __init__(self, path: str, flush_delay: float = 0.5):
+        self.path = path
+        self.flush_delay = flush_delay
+        self._posts = {}  # id -> post
+        self._order = []  # отсортированные (время, id)
+        self._ts = {}  # id -> время
+        self._dirty = False
+        self._flush_handle = None
+        self._flush_task = None
+        self._lock = asyncio.Lock()
+
+    # --------------------------------------------------------------------
+    # Чтение
+    # --------------------------------------------------------------------
+    def load(self):
+        self._posts.clear()
+        self._order.clear()
+        self._ts.clear()
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Старый формат — просто список словарей
+            legacy = isinstance(data, list)
+            posts = [decode(record) for record in (data if legacy else data["posts"])]
+        except Exception as e:
+            logging.error(f"Не удалось прочитать {self.path}: {e}")
+            return
+
+        for post in posts:
+            self._posts[post.id] = post
+            self._ts[post.id] = post_timestamp(post)
+        self._order = sorted((ts, post_id) for post_id, ts in self._ts.items())
+        # Старый файл сразу пересохраняем в новом формате (заодно с постоянными id)
+        if legacy:
+            logging.info(f"{self.path}: перевод {len(posts)} постов в компактный формат")
+            self._mark_dirty()
+
+    def __len__(self):
+        return len(self._posts)
+
+    def __iter__(self):
+        return iter([self._posts[post_id] for _, post_id in self._order])
+
+    def get(self, post_id):
+        return self._posts.get(post_id)
+
+    def by_index(self, idx: int):
+        if not 0 <= idx < len(self._order):
+            return None
+        return self._posts[self._order[idx][1]]
+
+    def page(self, offset: int, limit: int):
+        return [self._posts[post_id] for _, post_id in self._order[max(0, offset):offset + limit]]
+
+    def position(self, ts: float) -> int:
+        return bisect.bisect_left(self._order, (ts,))
+
+    # --------------------------------------------------------------------
+    # Изменение
+    # --------------------------------------------------------------------
+    def add(self, post) -> str:
+        if post.id in self._posts:
+            self._unindex(post.id)
+        self._posts[post.id] = post
+        self._index(post)
+        self._mark_dirty()
+        return post.id
+
+    def add_many(self, posts):
+        for post in posts:
+            if post.id in self._posts:
+                self._unindex(post.id)
+            self._posts[post.id] = post
+            self._ts[post.id] = post_timestamp(post)
+            self._order.append((self._ts[post.id], post.id))
+        # Одна сортировка на всю пачку вместо вставки по одному
+        self._order.sort()
+        self._mark_dirty()
+
+    def replace(self, post):
+        if post.id in self._posts:
+            self._unindex(post.id)
+            self._posts[post.id] = post
+            self._index(post)
+            self._mark_dirty()
+
+    def replace_many(self, posts):
+        for post in posts:
+            if post.id in self._posts:
+                self._posts[post.id] = post
+                self._ts[post.id] = post_timestamp(post)
+        # Индекс пересобирается одной сортировкой, а в файл уходит один снимок
+        self._order = sorted((ts, post_id) for post_id, ts in self._ts.items())
+        self._mark_dirty()
+
+    def remove(self, post_id):
+        post = self._posts.pop(post_id, None)
+        if post is not None:
+            self._unindex(post_id)
+            self._mark_dirty()
+        return post
+
+    def _index(self, post):
+        ts = post_timestamp(post)
+        self._ts[post.id] = ts
+        bisect.insort(self._order, (ts, post.id))
+
+    def _unindex(self, post_id):
+        key = (self._ts.pop(post_id), post_id)
+        i = bisect.bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+
+    # --------------------------------------------------------------------
+    # Запись на диск
+    # --------------------------------------------------------------------
+    def _mark_dirty(self):
+        self._dirty = True
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Вне event loop (скрипты, миграции) пишем при close()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Сохранить текущий снимок очереди, если есть изменения"""
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            posts = list(self._posts.values())
+            try:
+                await asyncio.to_thread(self._write, posts)
+            except Exception as e:
+                logging.error(f"Ошибка сохранения {self.path}: {e}")
+                self._mark_dirty()
+
+    def _write(self, posts):
+        with STORAGE_SECONDS.labels("save").time():
+            # По записи на строку: файл остаётся читаемым и не раздувается отступами
+            records = ",\n".join(
+                json.dumps(encode(post), ensure_ascii=False, separators=(",", ":")) for post in posts
+            )
+            atomic_write(self.path, f'{{"version": {FILE_VERSION}, "posts": [\n{records}\n]}}\n')
+
+    def flush_sync(self):
+        """Синхронное сохранение (для скриптов без event loop)"""
+        if self._dirty:
+            self._dirty = False
+            self._write(list(self._posts.values()))
+
+    async def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+
+
+# ========================================================================
+# SQLITE
+# ========================================================================
+class SqlitePostStore(PostStore):
+    """Очередь постов в SQLite с индексом по времени публикации
+
+    Поиск поста по id, N-го поста, страницы и позиции времени в очереди и
+    удаление — индексные запросы, без чтения всей очереди.
+    """
+
+    # Колонка channel и индекс по ней остались от прежних версий: их никто не читал
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS posts (
+            id TEXT PRIMARY KEY,
+            ts REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS posts_ts ON posts (ts, id);
+        DROP INDEX IF EXISTS posts_channel_ts;
+    """
+
+    def __init__(self, path: str, legacy_json: str = None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._db = None
+        self._data_version = None
+
+    def load(self):
+        is_new = not os.path.exists(self.path)
+        self._db = sqlite3.connect(self.path, isolation_level=None)
+        # WAL + NORMAL: коммит без fsync на каждую операцию, но без потери целостности
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        if not is_new and self._db.execute("PRAGMA user_version").fetchone()[0] < FILE_VERSION:
+            self._migrate_rows()
+        self._db.execute(f"PRAGMA user_version = {FILE_VERSION}")
+
+        # При первом запуске переносим старую очередь из JSON
+        if is_new and self.legacy_json and os.path.exists(self.legacy_json):
+            source = JsonPostStore(self.legacy_json)
+            source.load()
+            self.add_many(list(source))
+            logging.info(f"Перенесено {len(source)} постов из {self.legacy_json} в {self.path}")
+
+    def _migrate_rows(self):
+        """Переписать строки со словарями старого формата в компактные записи"""
+        rows = self._db.execute("SELECT data FROM posts").fetchall()
+        posts = [decode(json.loads(data)) for data, in rows if data.startswith("{")]
+        if posts:
+            self.add_many(posts)
+            logging.info(f"{self.path}: перевод {len(posts)} постов в компактный формат")
+
+    async def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def changed_externally(self) -> bool:
+        # data_version меняется только после коммитов других соединений
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        changed = self._data_version is not None and version != self._data_version
+        self._data_version = version
+        return changed
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+    def __iter__(self):
+        rows = self._db.execute("SELECT data FROM posts ORDER BY ts, id")
+        return (decode(json.loads(data)) for data, in rows)
+
+    def _one(self, sql, params=()):
+        row = self._db.execute(sql, params).fetchone()
+        return decode(json.loads(row[0])) if row else None
+
+    def get(self, post_id):
+        return self._one("SELECT data FROM posts WHERE id = ?", (post_id,))
+
+    def by_index(self, idx: int):
+        if idx < 0:
+            return None
+        return self._one("SELECT data FROM posts ORDER BY ts, id LIMIT 1 OFFSET ?", (idx,))
+
+    def page(self, offset: int, limit: int):
+        rows = self._db.execute(
+            "SELECT data FROM posts ORDER BY ts, id LIMIT ? OFFSET ?", (limit, max(0, offset))
+        )
+        return [decode(json.loads(data)) for data, in rows]
+
+    def position(self, ts: float) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM posts WHERE ts < ?", (ts,)).fetchone()[0]
+
+    def add(self, post) -> str:
+        self._db.execute(
+            "INSERT OR REPLACE INTO posts (id, ts, data) VALUES (?, ?, ?)",
+            self._row(post),
+        )
+        return post.id
+
+    def add_many(self, posts):
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO posts (id, ts, data) VALUES (?, ?, ?)",
+                [self._row(post) for post in posts],
+            )
+
+    def replace(self, post):
+        post_id, ts, data = self._row(post)
+        self._db.execute("UPDATE posts SET ts = ?, data = ? WHERE id = ?", (ts, data, post_id))
+
+    def replace_many(self, posts):
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE posts SET ts = ?, data = ? WHERE id = ?",
+                [(ts, data, post_id) for post_id, ts, data in map(self._row, posts)],
+            )
+
+    def remove(self, post_id):
+        post = self.get(post_id)
+        if post is not None:
+            self._db.execute("DELETE FROM posts WHERE id = ?", (post_id,))
+        return post
+
+    @staticmethod
+    def _row(post):
+        ts = post_timestamp(post)
+        # В SQLite нет inf, битые времена уводим в самый конец очереди
+        if ts == float("inf"):
+            ts = sys.float_info.max
+        return (post.id, ts, json.dumps(encode(post), ensure_ascii=False, separators=(",", ":")))
+
+
+# ========================================================================
+# ВЫБОР ХРАНИЛИЩА И МИГРАЦИЯ
+# ========================================================================
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def migrate_json_to_sqlite(json_path: str, db_path: str) -> int:
+    """Перенести очередь из posts.json в SQLite, вернуть число постов"""
+    source = JsonPostStore(json_path)
+    source.load()
+    target = SqlitePostStore(db_path)
+    target.load()
+    target.add_many(list(source))
+    asyncio.run(target.close())
+    return len(source)
+
+
+def open_store(path: str) -> PostStore:
+    """Открыть хранилище по пути: .db/.sqlite — SQLite, остальное — JSON
+
+    При первом запуске на SQLite лежащий рядом posts.json переносится в базу.
+    """
+    if path.endswith(SQLITE_EXTENSIONS):
+        legacy_json = os.path.join(os.path.dirname(path), "posts.json")
+        return SqlitePostStore(path, legacy_json=legacy_json)
+    return JsonPostStore(path)
+
+
+if __name__ == "__main__":
+    # python storage.py posts.json posts.db
+    if len(sys.argv) != 3:
+        sys.exit("Использование: python storage.py <posts.json> <posts.db>")
+    print(f"Перенесено постов: {migrate_json_to_sqlite(sys.argv[1], sys.argv[2])}")
@@ -0,0 +1,202 @@
+import os
+import re
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from aiogram import BaseMiddleware
+
+from slots import SlotIndex
+from duplicates import DuplicateIndex
+
+# Имя тенанта становится именем его каталога с данными
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+_current = ContextVar("tenant")
+
+
+@dataclass(frozen=True)
+class TenantSpec:
+    """Запись реестра: бот, его админы и файлы данных
+
+    Относительные пути файлов считаются от directory.
+    """
+
+    name: str
+    token: str
+    admins: tuple = ()
+    directory: str = "."
+    channel_id: str = ""
+    config_file: str = "config.json"
+    posts_storage: str = "posts.json"
+    ledger_file: str = "ledger.db"
+    media_cache_file: str = "media_cache.db"
+    archive_file: str = "archive.jsonl"
+    media_dir: str = ""
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+
+def load_registry(path: str):
+    """Записи реестра из tenants.json
+
+    {"tenants": [{"name": "news", "token_env": "NEWS_TOKEN", "admins": [1, 2],
+                  "channel_id": "@news", "posts_storage": "posts.db"}, ...]}
+
+    Токен задаётся прямо в "token" или именем переменной окружения в
+    "token_env". Данные тенанта лежат в "directory", по умолчанию —
+    tenants/<name> рядом с реестром. Бросает ValueError на ошибках.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    records = data.get("tenants") if isinstance(data, dict) else None
+    if not records:
+        raise ValueError(f"{path}: нужен непустой список tenants")
+    base = os.path.dirname(os.path.abspath(path))
+    specs, names, tokens = [], set(), set()
+    for record in records:
+        name = str(record.get("name") or "")
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"{path}: неверное имя тенанта {name!r} (латиница, цифры, _ и -)")
+        if name in names:
+            raise ValueError(f"{path}: тенант {name} указан дважды")
+        token = record.get("token") or os.getenv(record.get("token_env") or "") or ""
+        if not token:
+            raise ValueError(f"{path}: у тенанта {name} не задан token или token_env")
+        if token in tokens:
+            raise ValueError(f"{path}: у тенанта {name} тот же токен, что у другого")
+        try:
+            admins = tuple(int(admin) for admin in record.get("admins") or ())
+        except (TypeError, ValueError):
+            raise ValueError(f"{path}: admins тенанта {name} должны быть числовыми id")
+        names.add(name)
+        tokens.add(token)
+        optional = {
+            key: str(record[key]) for key in
+            ("config_file", "posts_storage", "ledger_file", "media_cache_file", "archive_file", "media_dir")
+            if record.get(key)
+        }
+        specs.append(TenantSpec(
+            name=name,
+            token=token,
+            admins=admins,
+            directory=os.path.join(base, record.get("directory") or os.path.join("tenants", name)),
+            channel_id=str(record.get("channel_id") or ""),
+            **optional,
+        ))
+    return specs
+
+
+@dataclass(eq=False)
+class Tenant:
+    """Бот одного канала: свои админы, настройки, очередь и журнал публикаций"""
+
+    name: str
+    admins: list
+    bot: object
+    store: object
+    ledger: object
+    media_cache: object
+    config_store: object
+    archive_file: str
+    media_dir: str = ""
+    slot_index: SlotIndex = field(default_factory=SlotIndex)
+    duplicates: DuplicateIndex = field(default_factory=DuplicateIndex)
+    albums: object = None
+
+
+class TenantRegistry:
+    """Все тенанты процесса, с поиском по имени и по боту"""
+
+    def __init__(self, tenants):
+        self._by_name = {tenant.name: tenant for tenant in tenants}
+        self._by_bot = {tenant.bot.id: tenant for tenant in tenants}
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __iter__(self):
+        return iter(self._by_name.values())
+
+    def get(self, name: str) -> Tenant:
+        return self._by_name[name]
+
+    def by_bot(self, bot) -> Tenant:
+        return self._by_bot[bot.id]
+
+
+# ========================================================================
+# ТЕКУЩИЙ ТЕНАНТ
+# ========================================================================
+def current() -> Tenant:
+    """Тенант, чьё обновление обрабатывается или чей пост публикуется"""
+    try:
+        return _current.get()
+    except LookupError:
+        raise RuntimeError("Нет текущего тенанта: код вызван вне обработчика и планировщика") from None
+
+
+def activate(tenant: Tenant):
+    """Сделать тенант текущим для всего контекста (режим с одним ботом)"""
+    _current.set(tenant)
+
+
+@contextmanager
+def using(tenant: Tenant):
+    """Сделать тенант текущим внутри блока"""
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+
+class TenantLocal:
+    """Атрибут текущего тенанта под видом глобального объекта
+
+    Обработчики и вспомогательные функции обращаются к store, bot, ADMIN_IDS
+    и т.п. как к глобальным объектам, а за каждым именем стоит объект того
+    тенанта, чей бот получил обновление или чей пост публикуется.
+    """
+
+    __slots__ = ("_attr",)
+
+    def __init__(self, attr: str):
+        object.__setattr__(self, "_attr", attr)
+
+    def _target(self):
+        return getattr(current(), self._attr)
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target(), name, value)
+
+    def __bool__(self):
+        return bool(self._target())
+
+    def __len__(self):
+        return len(self._target())
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __contains__(self, item):
+        return item in self._target()
+
+    def __repr__(self):
+        return f"<TenantLocal {self._attr}>"
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Outer-middleware диспетчера: обновление обрабатывается в контексте тенанта своего бота"""
+
+    def __init__(self, registry: TenantRegistry):
+        self.registry = registry
+
+    async def __call__(self, handler, event, data):
+        with using(self.registry.by_bot(data["bot"])):
+            return await handler(event, data)
@@ -0,0 +1,102 @@
+import hmac
+import signal
+import asyncio
+import logging
+from contextlib import suppress
+
+from aiohttp import web
+from aiogram.types import Update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Приём обновлений от Telegram по вебхуку вместо long polling
+
+    Каждое обновление сразу подтверждается ответом 200, а обрабатывается
+    в фоне через dp.feed_update. Одновременно обрабатывается не больше
+    concurrency обновлений; если в работе уже max_pending, сервер отвечает
+    503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, dp, bot, path: str = "/webhook", secret: str = "", host: str = "0.0.0.0",
+                 port: int = 8080, concurrency: int = 100, max_pending: int = 1000):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret:
+            token = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token, self.secret):
+                return web.Response(status=401)
+        if len(self._tasks) >= self.max_pending:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logging.error(f"Некорректное обновление в вебхуке: {e}")
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logging.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+
+    async def start(self, url: str = ""):
+        """Запустить HTTP-сервер и, если задан url, зарегистрировать вебхук в Telegram"""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Вебхук слушает {self.host}:{self.port}{self.path}")
+        if url:
+            await self.bot.set_webhook(
+                url.rstrip("/") + self.path,
+                secret_token=self.secret or None,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+
+    async def stop(self, timeout: float = 30):
+        """Перестать принимать обновления и дождаться обработки уже принятых"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=timeout)
+
+
+async def serve_webhook(dp, bot, url: str = "", **kwargs):
+    """Работать в режиме вебхука до SIGINT/SIGTERM"""
+    server = WebhookServer(dp, bot, **kwargs)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # На Windows обработчики сигналов не поддерживаются
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    await server.start(url)
+    try:
+        await stop.wait()
+    finally:
+        logging.info("Останавливаю вебхук")
+        await server.stop()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()